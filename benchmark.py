@@ -0,0 +1,296 @@
+# 图片处理流水线的性能测试和黄金图像回归检查，不需要显示器
+#
+# 性能测试：python benchmark.py run [结果文件] [--compare 旧结果文件] [--repeat 次数]
+# 黄金图像：python benchmark.py golden [--update]
+# 定时任务：python benchmark.py timers
+
+import io
+import sys
+import json
+import time
+import random
+import hashlib
+import platform
+import statistics
+
+import PIL
+from PIL import Image
+
+import zsj
+
+# 黄金图像摘要文件，由 golden --update 根据逐像素参考实现生成
+GOLDEN_PATH = "golden_frames.json"
+# 性能测试的源图片边长和帧数
+BENCH_SIZES = [64, 150, 300, 600]
+BENCH_FRAME_COUNTS = [1, 8, 32]
+
+
+def synthetic_frame(rng, width, height):
+    """生成一帧测试图片：透明背景上的若干色块，包含半透明和接近白色的像素
+
+    只用随机数直接写像素，不依赖 Pillow 的绘图实现，保证不同版本生成的图片一致
+    """
+    data = bytearray(width * height * 4)
+    for _ in range(rng.randint(3, 8)):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1 = min(width, x0 + rng.randint(1, width // 2 + 1))
+        y1 = min(height, y0 + rng.randint(1, height // 2 + 1))
+        if rng.random() < 0.3:
+            color = [rng.randint(235, 255) for _ in range(3)]  # 过亮的颜色
+        else:
+            color = [rng.randrange(256) for _ in range(3)]
+        alpha = rng.choice([255, 255, 200, 150, 100, 60])
+
+        row = bytes(color + [alpha]) * (x1 - x0)
+        for y in range(y0, y1):
+            start = (y * width + x0) * 4
+            data[start:start + len(row)] = row
+            # 色块边缘随机半透明，模拟抗锯齿
+            edge_xs = range(x0, x1) if y in (y0, y1 - 1) else (x0, x1 - 1)
+            for x in edge_xs:
+                data[(y * width + x) * 4 + 3] = rng.randrange(256)
+    return Image.frombytes('RGBA', (width, height), bytes(data))
+
+
+def synthetic_gif(seed, size, frame_count):
+    """生成测试用的GIF文件内容"""
+    rng = random.Random(seed)
+    frames = [synthetic_frame(rng, size, size) for _ in range(frame_count)]
+    buffer = io.BytesIO()
+    frames[0].save(buffer, format='GIF', save_all=True, append_images=frames[1:],
+                   duration=100, loop=0, disposal=2)
+    return buffer.getvalue()
+
+
+def decode_frame(img, index):
+    img.seek(index)
+    return img.convert('RGBA')
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def bench_case(size, frame_count, repeat):
+    """测试一种尺寸和帧数组合，返回各阶段每帧耗时（毫秒，取中位数）"""
+    gif_bytes = synthetic_gif(size * 1000 + frame_count, size, frame_count)
+    processor = zsj.AnimatedGif("benchmark")
+    samples = {'decode': [], 'resize': [], 'clean_transparency': [],
+               'create_mask_image': [], 'enhance_edges': []}
+    if zsj.NUMPY_AVAILABLE:
+        samples['process_frame_fast'] = []
+
+    for _ in range(repeat):
+        with Image.open(io.BytesIO(gif_bytes)) as img:
+            decoded = []
+            for index in range(frame_count):
+                frame, ms = timed(decode_frame, img, index)
+                samples['decode'].append(ms)
+                decoded.append(frame)
+
+        for frame in decoded:
+            resized, ms = timed(frame.resize, zsj.FRAME_SIZE, Image.Resampling.LANCZOS)
+            samples['resize'].append(ms)
+
+            cleaned, ms = timed(processor.clean_transparency, resized.copy())
+            samples['clean_transparency'].append(ms)
+            masked, ms = timed(processor.create_mask_image, cleaned)
+            samples['create_mask_image'].append(ms)
+            _, ms = timed(processor.enhance_edges, masked)
+            samples['enhance_edges'].append(ms)
+
+            if zsj.NUMPY_AVAILABLE:
+                _, ms = timed(processor.process_frame_fast, resized)
+                samples['process_frame_fast'].append(ms)
+
+    result = {'source_size': size, 'frames': frame_count}
+    result.update({f"{stage}_ms": round(statistics.median(values), 4) for stage, values in samples.items()})
+    return result
+
+
+def run_benchmark(output_path="bench_results.json", compare_path=None, repeat=3):
+    results = []
+    for size in BENCH_SIZES:
+        for frame_count in BENCH_FRAME_COUNTS:
+            result = bench_case(size, frame_count, repeat)
+            results.append(result)
+            stages = ", ".join(f"{k[:-3]} {v:.3f}" for k, v in result.items() if k.endswith('_ms'))
+            print(f"{size}x{size} {frame_count}帧: {stages} (毫秒/帧)")
+
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'pillow': PIL.__version__,
+            'numpy': zsj.np.__version__ if zsj.NUMPY_AVAILABLE else None,
+            'pipeline_version': zsj.PIPELINE_VERSION,
+            'frame_size': list(zsj.FRAME_SIZE),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"结果已写入 {output_path}")
+
+    if compare_path:
+        compare_results(compare_path, report)
+
+
+def compare_results(baseline_path, report):
+    """和之前的结果对比，打印每个阶段的耗时比例（<1 表示变快）"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    old = {(r['source_size'], r['frames']): r for r in baseline['results']}
+
+    print(f"与 {baseline_path} 对比（新/旧）：")
+    for result in report['results']:
+        previous = old.get((result['source_size'], result['frames']))
+        if previous is None:
+            continue
+        ratios = [f"{k[:-3]} {v / previous[k]:.2f}x" for k, v in result.items()
+                  if k.endswith('_ms') and previous.get(k)]
+        print(f"  {result['source_size']}x{result['source_size']} {result['frames']}帧: {', '.join(ratios)}")
+
+
+def golden_cases():
+    """黄金图像的输入：直接生成目标尺寸的帧，不经过缩放，结果只取决于处理算法"""
+    rng = random.Random(20240320)
+    width, height = zsj.FRAME_SIZE
+    return [synthetic_frame(rng, width, height) for _ in range(12)]
+
+
+def digest(img):
+    return hashlib.sha256(img.tobytes()).hexdigest()
+
+
+def check_golden(update=False):
+    """检查处理结果与黄金图像逐像素一致，返回是否通过"""
+    processor = zsj.AnimatedGif("golden")
+    expected = [digest(processor.process_frame_reference(frame)) for frame in golden_cases()]
+
+    if update:
+        with open(GOLDEN_PATH, 'w', encoding='utf-8') as f:
+            json.dump({'pipeline_version': zsj.PIPELINE_VERSION, 'digests': expected}, f, indent=2)
+        print(f"已更新黄金图像摘要: {GOLDEN_PATH}")
+        return True
+
+    with open(GOLDEN_PATH, 'r', encoding='utf-8') as f:
+        golden = json.load(f)
+
+    passed = True
+    if golden['digests'] != expected:
+        print("参考实现的输出与黄金图像不一致（修改了处理算法？需要递增 PIPELINE_VERSION 并 --update）")
+        passed = False
+
+    if zsj.NUMPY_AVAILABLE:
+        for index, frame in enumerate(golden_cases()):
+            if digest(processor.process_frame_fast(frame)) != golden['digests'][index]:
+                print(f"向量化实现第 {index} 帧与黄金图像不一致")
+                passed = False
+    else:
+        print("numpy 未安装，跳过向量化实现的检查")
+
+    print("黄金图像检查通过" if passed else "黄金图像检查失败")
+    return passed
+
+
+class FakeRoot:
+    """代替 Tk 根窗口，只记录 TickScheduler 挂上的 after 回调，不需要显示器"""
+
+    def __init__(self):
+        self.pending = {}
+        self.counter = 0
+
+    def after(self, delay_ms, callback):
+        self.counter += 1
+        self.pending[self.counter] = callback
+        return self.counter
+
+    def after_cancel(self, after_id):
+        self.pending.pop(after_id, None)
+
+
+def advance(scheduler, seconds):
+    """执行 seconds 秒内到期的任务，用放宽到期容差代替真的等待"""
+    tolerance = scheduler.tolerance
+    scheduler.tolerance = seconds
+    try:
+        scheduler.tick()
+    finally:
+        scheduler.tolerance = tolerance
+
+
+def check_timers():
+    """检查启动时的调度和反复 restart_movement() 之后，每个循环只有一个任务在等待"""
+    scheduler = zsj.TickScheduler(FakeRoot())
+    # 只设置移动和抖动检查用到的属性，调用的是 DesktopPet 自己的方法
+    pet = object.__new__(zsj.DesktopPet)
+    pet.scheduler = scheduler
+    pet.motion_clock = zsj.MotionClock()
+    pet.state = "manual"
+    pet.manual_timer = time.time()
+    pet.mode = "good"
+    pet.last_shake_time = 0
+    pet.shake_cooldown = 60
+    pet.is_shaking = False
+
+    passed = True
+
+    def expect(stage):
+        nonlocal passed
+        counts = scheduler.live_counts()
+        for kind in ('check_shake', 'move_pet'):
+            if counts.get(kind, 0) != 1:
+                print(f"{stage}: {kind} 有 {counts.get(kind, 0)} 个任务在等待（应为1）")
+                passed = False
+
+    # 和 DesktopPet.__init__ 中的顺序相同
+    pet.restart_movement()
+    pet.schedule_screen_shake()
+    expect("启动后")
+
+    advance(scheduler, 0)
+    expect("第一次移动后")
+
+    for round_index in range(5):
+        pet.restart_movement()
+        pet.restart_movement()
+        expect(f"第 {round_index + 1} 轮重启移动后")
+        advance(scheduler, 1)
+        expect(f"第 {round_index + 1} 轮移动后")
+
+    # 让抖动检查触发并重新登记自己
+    advance(scheduler, 30)
+    expect("抖动检查执行后")
+
+    print("定时任务检查通过" if passed else "定时任务检查失败")
+    return passed
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    command = args.pop(0) if args else "run"
+
+    if command == "golden":
+        sys.exit(0 if check_golden(update="--update" in args) else 1)
+    elif command == "timers":
+        sys.exit(0 if check_timers() else 1)
+    elif command == "run":
+        compare_path = None
+        repeat = 3
+        if "--compare" in args:
+            compare_path = args.pop(args.index("--compare") + 1)
+            args.remove("--compare")
+        if "--repeat" in args:
+            repeat = int(args.pop(args.index("--repeat") + 1))
+            args.remove("--repeat")
+        run_benchmark(args[0] if args else "bench_results.json", compare_path, repeat)
+    else:
+        print("用法：python benchmark.py run [结果文件] [--compare 旧结果文件] [--repeat 次数]\n"
+              "      python benchmark.py golden [--update]\n"
+              "      python benchmark.py timers")
+        sys.exit(2)
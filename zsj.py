@@ -10,9 +10,26 @@ import random
 import time
 import threading
 import os
+import sys
+import mmap
+import ctypes
+import ctypes.util
 import psutil
 import gc
-from PIL import Image, ImageTk, ImageDraw
+import json
+import struct
+import hashlib
+import heapq
+import itertools
+import multiprocessing
+import queue
+import select
+import sqlite3
+from collections import OrderedDict, deque, namedtuple
+from functools import reduce
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from PIL import Image, ImageTk, ImageDraw, ImageChops
 import datetime
 
 # 可选依赖，如果没有安装会显示警告但不影响基本功能
@@ -32,60 +49,461 @@ except ImportError:
     WIN32_AVAILABLE = False
     print("警告：pywin32 未安装，某些捣蛋功能可能无法使用")
 
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    print("警告：numpy 未安装，图片处理将使用较慢的逐像素实现")
+
+
+# 动画帧尺寸
+FRAME_SIZE = (150, 150)
+# 图片处理流水线版本，修改处理算法后需要递增，使旧缓存失效
+PIPELINE_VERSION = 1
+# 处理后帧的磁盘缓存目录
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.desktop_pet', 'cache')
+# 支持的图片格式
+IMAGE_EXTENSIONS = ('.png', '.gif', '.jpg', '.jpeg')
+# 预编译资源包，存在时优先于 tupian 文件夹加载
+BUNDLE_PATH = "tupian.bundle"
+# 系统状态历史数据库
+METRICS_DB_PATH = os.path.join(os.path.expanduser('~'), '.desktop_pet', 'metrics.db')
+
+
+class FrameCache:
+    """处理后帧的磁盘缓存，按文件内容哈希、目标尺寸和流水线版本区分"""
+
+    MAGIC = b'DPF1'
+    HEADER = struct.Struct('<4sHHI')  # 标识、宽、高、帧数
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=200 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes  # 缓存总大小上限，超出后按最近最少使用淘汰
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self.index = {}  # key -> {'source': 源文件路径, 'size': 字节数, 'last_used': 时间戳}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()  # 后台预取线程和主线程会同时访问
 
-class AnimatedGif:
-    """处理GIF动画的类"""
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            if os.path.exists(self.index_path):
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    self.index = json.load(f)
+        except Exception as e:
+            print(f"读取帧缓存索引失败: {e}")
+            self.index = {}
+
+    def contains(self, key):
+        with self.lock:
+            return key in self.index
+
+    def make_key(self, path, size):
+        """根据文件内容、目标尺寸和流水线版本生成缓存键"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return f"{digest.hexdigest()[:32]}_{size[0]}x{size[1]}_v{PIPELINE_VERSION}"
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key + '.frames')
+
+    def get(self, key):
+        """读取缓存的帧，返回 (RGBA图片列表, 延迟列表)，未命中返回 None"""
+        with self.lock:
+            return self._get(key)
+
+    def _get(self, key):
+        if key not in self.index:
+            self.misses += 1
+            return None
 
-    def __init__(self, path):
-        self.frames = []
+        try:
+            with open(self.entry_path(key), 'rb') as f:
+                data = f.read()
+            magic, width, height, count = self.HEADER.unpack_from(data, 0)
+            if magic != self.MAGIC:
+                raise ValueError("缓存文件格式错误")
+
+            offset = self.HEADER.size
+            delays = list(struct.unpack_from(f'<{count}I', data, offset))
+            offset += 4 * count
+
+            frame_bytes = width * height * 4
+            if len(data) != offset + frame_bytes * count:
+                raise ValueError("缓存文件不完整")
+
+            images = []
+            for i in range(count):
+                start = offset + i * frame_bytes
+                images.append(Image.frombytes('RGBA', (width, height), data[start:start + frame_bytes]))
+        except Exception as e:
+            print(f"读取帧缓存失败 {key}: {e}")
+            self.remove(key)
+            self.misses += 1
+            return None
+
+        self.index[key]['last_used'] = time.time()
+        self.dirty = True
+        self.hits += 1
+        return images, delays
+
+    def put(self, key, source, images, delays):
+        """写入处理好的帧，同一源文件的旧缓存会被替换"""
+        with self.lock:
+            self._put(key, source, images, delays)
+
+    def _put(self, key, source, images, delays):
+        try:
+            source = os.path.abspath(source)
+            for old_key in [k for k, v in self.index.items() if v['source'] == source and k != key]:
+                self.remove(old_key)
+
+            width, height = images[0].size
+            parts = [self.HEADER.pack(self.MAGIC, width, height, len(images)),
+                     struct.pack(f'<{len(delays)}I', *delays)]
+            parts.extend(img.tobytes() for img in images)
+            data = b''.join(parts)
+
+            # 先写临时文件再替换，避免中途退出留下损坏的缓存
+            tmp_path = self.entry_path(key) + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.entry_path(key))
+
+            self.index[key] = {'source': source, 'size': len(data), 'last_used': time.time()}
+            self.dirty = True
+            self.evict()
+        except Exception as e:
+            print(f"写入帧缓存失败 {source}: {e}")
+
+    def remove(self, key):
+        """删除一条缓存"""
+        with self.lock:
+            self.index.pop(key, None)
+            self.dirty = True
+            try:
+                os.remove(self.entry_path(key))
+            except OSError:
+                pass
+
+    def prune(self, sources):
+        """删除源文件已不存在的缓存"""
+        sources = {os.path.abspath(s) for s in sources}
+        with self.lock:
+            for key in [k for k, v in self.index.items() if v['source'] not in sources]:
+                self.remove(key)
+
+    def evict(self):
+        """超出容量上限时按最近最少使用淘汰"""
+        with self.lock:
+            total = sum(v['size'] for v in self.index.values())
+            for key in sorted(self.index, key=lambda k: self.index[k]['last_used']):
+                if total <= self.max_bytes:
+                    break
+                total -= self.index[key]['size']
+                self.remove(key)
+
+    def save(self):
+        """保存缓存索引"""
+        with self.lock:
+            if not self.dirty:
+                return
+            try:
+                tmp_path = self.index_path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.index, f)
+                os.replace(tmp_path, self.index_path)
+                self.dirty = False
+            except Exception as e:
+                print(f"保存帧缓存索引失败: {e}")
+
+
+class FrameBudget:
+    """已解码动画帧的全局内存预算，超出时按最近最少使用释放空闲动画"""
+
+    def __init__(self, max_mb=64):
+        self.max_bytes = max_mb * 1024 * 1024
+        self.entries = OrderedDict()  # 动画对象 -> 帧占用字节数，越靠后越近使用
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # 每个显示者自己的画布（PlaybackCursor.canvas）占用，不能释放但计入预算
+        self.canvas_bytes = 0
+
+    def total_bytes(self):
+        return sum(self.entries.values()) + self.canvas_bytes
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def record_hit(self, gif):
+        """动画被再次使用时帧仍在内存中"""
+        self.hits += 1
+        if gif in self.entries:
+            self.entries.move_to_end(gif)
+
+    def record_load(self, gif):
+        """动画的帧刚被（重新）创建"""
+        self.misses += 1
+        self.entries[gif] = gif.memory_bytes()
+        self.entries.move_to_end(gif)
+
+    def forget(self, gif):
+        """动画已被替换或删除，不再统计它的占用"""
+        self.entries.pop(gif, None)
+
+    def enforce(self, pinned):
+        """释放最久未使用的动画直到不超出预算，pinned 中的动画正在显示，不会被释放"""
+        total = self.total_bytes()
+        for gif in list(self.entries):
+            if total <= self.max_bytes:
+                break
+            if gif in pinned:
+                continue
+            total -= self.entries.pop(gif)
+            gif.unload()
+            self.evictions += 1
+
+
+# 一帧相对上一帧的变化区域：左上角坐标和该区域的图像
+FramePatch = namedtuple('FramePatch', ['x', 'y', 'image'])
+
+
+def changed_box(before, after):
+    """两帧之间发生变化的矩形区域 (左, 上, 右, 下)，完全相同时返回 None"""
+    diff = ImageChops.difference(before, after)
+    # 合并四个通道，只要任一通道有差异就算变化
+    return reduce(ImageChops.lighter, diff.split()).getbbox()
+
+
+class AnimatedGif:
+    """处理GIF动画的类，帧在第一次使用时才解码
+
+    帧以关键帧加变化区域的形式保存：frames[i] 是从第 i-1 帧变到第 i 帧需要
+    覆盖的区域（frames[0] 是从最后一帧回到第一帧），没有变化时为 None
+    """
+
+    SHORT_DELAY_MS = 10  # 很多GIF把延迟写成0或10毫秒，表示“使用默认速度”
+    DEFAULT_DELAY_MS = 100
+
+    def __init__(self, path, frame_cache=None, frame_budget=None):
+        self.path = path
+        self.frame_cache = frame_cache
+        self.frame_budget = frame_budget
+        self.keyframe = None  # 第一帧的完整图像
+        self.size = None
+        self.frames = []  # FramePatch 或 None
         self.delays = []
-        self.current_frame = 0
+        self.loaded = False  # PhotoImage帧是否已创建
+        self.pending = False  # 是否正在进程池中预处理
+        self.images = None  # 预取好的RGBA帧，等待在主线程中转换为PhotoImage
+        self.load_error = None
+        self.load_lock = threading.Lock()
+        self.frame_key = None  # 磁盘缓存键，文件内容只哈希一次；文件修改后热重载会创建新对象
+
+    def cache_key(self, frame_cache):
+        """磁盘缓存键，第一次调用时读取并哈希文件，之后直接返回"""
+        if self.frame_key is None:
+            self.frame_key = frame_cache.make_key(self.path, FRAME_SIZE)
+        return self.frame_key
+
+    def prefetch(self):
+        """解码并处理所有帧，可以在后台线程中调用（不涉及Tk）"""
+        with self.load_lock:
+            if self.loaded or self.images is not None or self.load_error:
+                return
+            try:
+                self.images, self.delays = self.load_frames(self.path, self.frame_cache)
+            except Exception as e:
+                self.load_error = e
+            if self.frame_cache is not None:
+                self.frame_cache.save()
+
+    def receive_preloaded(self, images, delays, error=None):
+        """接收进程池的处理结果，images 为 None 表示结果已在磁盘缓存中"""
+        with self.load_lock:
+            self.pending = False
+            if error is not None:
+                self.load_error = error
+            elif images is not None and not self.loaded:
+                self.images, self.delays = images, delays
+
+    def ensure_loaded(self):
+        """确保帧已可显示，必须在Tk主线程中调用"""
+        if self.loaded:
+            return
 
-        try:
-            with Image.open(path) as img:
-                # 获取GIF的所有帧
-                frame_index = 0
-                while True:
-                    try:
-                        img.seek(frame_index)
-                        # 获取帧延迟时间
-                        delay = img.info.get('duration', 100)
-                        self.delays.append(delay)
-
-                        # 转换为RGBA并调整大小
-                        frame = img.convert('RGBA')
-                        frame = frame.resize((150,150 ), Image.Resampling.LANCZOS)
-
-                        # 处理透明度，确保清晰显示
-                        frame = self.clean_transparency(frame)
-                        # 进一步优化透明效果
-                        frame = self.create_mask_image(frame)
-                        # 添加边缘增强
-                        frame = self.enhance_edges(frame)
-
-                        self.frames.append(ImageTk.PhotoImage(frame))
-
-                        frame_index += 1
-                    except EOFError:
-                        break
-
-            if not self.frames:
-                # 如果不是GIF或无法读取，作为静态图片处理
-                img = Image.open(path)
-                img = img.convert('RGBA')
-                img = img.resize((100, 100), Image.Resampling.LANCZOS)
-                img = self.clean_transparency(img)
-                img = self.create_mask_image(img)
-                img = self.enhance_edges(img)
-                self.frames.append(ImageTk.PhotoImage(img))
-                self.delays.append(100)
+        # 如果后台已经预取完成这里会直接返回，否则同步解码
+        self.prefetch()
 
-        except Exception as e:
-            print(f"加载图片失败 {path}: {e}")
-            # 创建默认图片
-            img = Image.new('RGBA', (100, 100), (255, 182, 193, 255))
-            self.frames.append(ImageTk.PhotoImage(img))
-            self.delays.append(100)
+        with self.load_lock:
+            if self.images:
+                self.build_frames(self.images, self.delays)
+                print(f"成功加载: {os.path.basename(self.path)} (帧数: {len(self.frames)})")
+            else:
+                print(f"加载图片失败 {self.path}: {self.load_error}")
+                # 创建默认图片
+                img = Image.new('RGBA', (100, 100), (255, 182, 193, 255))
+                self.build_frames([img], [100])
+            self.images = None
+            self.loaded = True
+
+        if self.frame_budget is not None:
+            self.frame_budget.record_load(self)
+
+    def build_frames(self, images, delays):
+        """把完整帧编码为关键帧加变化区域，完全相同的连续帧合并并累加延迟
+
+        Pillow 在 seek 时已按 GIF 的处置方式（disposal）合成出完整画面，
+        所以直接比较处理后的相邻完整帧就能得到正确的变化区域。
+        延迟不超过 SHORT_DELAY_MS 的帧按浏览器的惯例当作 DEFAULT_DELAY_MS
+        """
+        delays = [delay if delay > self.SHORT_DELAY_MS else self.DEFAULT_DELAY_MS for delay in delays]
+        kept = [images[0]]
+        kept_delays = [delays[0]]
+        boxes = [None]
+        for img, delay in zip(images[1:], delays[1:]):
+            box = changed_box(kept[-1], img)
+            if box is None:
+                kept_delays[-1] += delay
+            else:
+                kept.append(img)
+                kept_delays.append(delay)
+                boxes.append(box)
+
+        # 从最后一帧循环回第一帧的变化区域
+        if len(kept) > 1:
+            boxes[0] = changed_box(kept[-1], kept[0])
+
+        self.keyframe = ImageTk.PhotoImage(kept[0])
+        self.size = kept[0].size
+        self.frames = [None if box is None else FramePatch(box[0], box[1], ImageTk.PhotoImage(img.crop(box)))
+                       for img, box in zip(kept, boxes)]
+        self.delays = kept_delays
+
+    def memory_bytes(self):
+        """已创建的PhotoImage占用的字节数，Tk 中每个像素占4字节"""
+        if self.keyframe is None:
+            return 0
+        images = [self.keyframe] + [patch.image for patch in self.frames if patch is not None]
+        return sum(image.width() * image.height() * 4 for image in images)
+
+    def unload(self):
+        """释放PhotoImage帧，下次使用时从磁盘缓存重新创建"""
+        with self.load_lock:
+            self.keyframe = None
+            self.frames = []
+            self.loaded = False
+            self.load_error = None
+
+    def load_frames(self, path, frame_cache=None):
+        """获取处理好的RGBA帧和延迟，优先从磁盘缓存读取"""
+        key = None
+        if frame_cache is not None:
+            key = self.cache_key(frame_cache)
+            cached = frame_cache.get(key)
+            if cached is not None:
+                return cached
+
+        images, delays = self.decode_frames(path)
+        if key is not None:
+            frame_cache.put(key, path, images, delays)
+        return images, delays
+
+    def decode_frames(self, path):
+        """解码图片的所有帧并完成缩放和处理"""
+        images = []
+        delays = []
+
+        with Image.open(path) as img:
+            # 获取GIF的所有帧
+            frame_index = 0
+            while True:
+                try:
+                    img.seek(frame_index)
+                    # 获取帧延迟时间
+                    delay = img.info.get('duration', 100)
+                    delays.append(delay)
+
+                    # 转换为RGBA并调整大小
+                    frame = img.convert('RGBA')
+                    frame = frame.resize(FRAME_SIZE, Image.Resampling.LANCZOS)
+
+                    # 透明度清理、遮罩优化和边缘增强
+                    frame = self.process_frame(frame)
+
+                    images.append(frame)
+
+                    frame_index += 1
+                except EOFError:
+                    break
+
+        if not images:
+            # 如果不是GIF或无法读取，作为静态图片处理
+            img = Image.open(path)
+            img = img.convert('RGBA')
+            img = img.resize((100, 100), Image.Resampling.LANCZOS)
+            img = self.process_frame(img)
+            images.append(img)
+            delays.append(100)
+
+        return images, delays
+
+    def process_frame(self, img):
+        """处理单帧：透明度清理、遮罩优化、边缘增强"""
+        if NUMPY_AVAILABLE:
+            return self.process_frame_fast(img)
+        return self.process_frame_reference(img)
+
+    def process_frame_reference(self, img):
+        """逐像素参考实现，向量化版本的结果必须与它逐位一致"""
+        # 处理透明度，确保清晰显示
+        img = self.clean_transparency(img)
+        # 进一步优化透明效果
+        img = self.create_mask_image(img)
+        # 添加边缘增强
+        return self.enhance_edges(img)
+
+    def process_frame_fast(self, img):
+        """整帧向量化实现，三个阶段一次完成"""
+        if img.mode != 'RGBA':
+            img = img.convert('RGBA')
+        arr = np.asarray(img)
+        opaque = arr[..., 3] >= 128
+        r = arr[..., 0].astype(np.int16)
+        g = arr[..., 1].astype(np.int16)
+        b = arr[..., 2].astype(np.int16)
+
+        # 阶段1 clean_transparency：alpha<128 透明，其余不透明，过亮像素减20
+        pale = opaque & (r > 240) & (g > 240) & (b > 240)
+        pale_sub = pale * np.int16(20)
+        r -= pale_sub
+        g -= pale_sub
+        b -= pale_sub
+
+        # 阶段2 create_mask_image：阶段1之后alpha只有0和255，
+        # 不存在 0<a<200 的半透明像素，因此只需把透明像素清零
+
+        # 阶段3 enhance_edges：相邻8格有透明像素或位于图像边界即为边缘
+        transparent = np.pad(~opaque, 1, constant_values=True)
+        rows = transparent[:, :-2] | transparent[:, 1:-1] | transparent[:, 2:]
+        edge = rows[:-2] | rows[1:-1] | rows[2:]
+        bright = (r + g + b) > 600
+        sub = np.where(edge, np.int16(30), bright * np.int16(15))
+
+        out = np.empty(arr.shape, dtype=np.uint8)
+        for i, channel in enumerate((r, g, b)):
+            channel -= sub
+            np.maximum(channel, 0, out=channel)
+            channel *= opaque
+            out[..., i] = channel
+        out[..., 3] = opaque * np.uint8(255)
+        return Image.fromarray(out)
 
     def clean_transparency(self, img):
         """清理透明度，确保清晰显示"""
@@ -209,24 +627,1630 @@ class AnimatedGif:
 
         return False
 
-    def get_current_frame(self):
-        """获取当前帧"""
-        return self.frames[self.current_frame]
+
+class PlaybackCursor:
+    """一个显示者（主宠物或某个分身）的播放位置，帧数据由动画对象共享
+
+    每个显示者有自己的一张画布图像，换帧时只把变化区域复制到画布上，画布的内存计入 budget。
+    播放按单调时钟计算每一帧的结束时间，刷新晚了就跳过已经过期的帧，不会越播越慢
+    """
+
+    __slots__ = ('gif', 'frame_index', 'canvas', 'shown_index', 'deadline', 'dropped', 'budget')
+
+    MIN_DELAY_MS = 1  # 防止延迟为0时无限循环，实际的短延迟已在 build_frames 中换算
+    EARLY_SECONDS = 0.003  # 调度器可能提前几毫秒触发，差这么多也算到期
+
+    def __init__(self, gif=None, budget=None):
+        self.gif = gif
+        self.budget = budget  # FrameBudget，统计画布占用
+        self.frame_index = 0
+        self.canvas = None  # 该显示者正在显示的 PhotoImage
+        self.shown_index = None  # 画布上当前画的是第几帧
+        self.deadline = None  # 当前帧应该结束的时间（time.monotonic()）
+        self.dropped = 0  # 累计跳过的帧数
+
+    def show(self, gif):
+        """切换到另一个动画时从第一帧开始播放"""
+        if gif is not self.gif:
+            self.gif = gif
+            self.frame_index = 0
+            self.shown_index = None
+            self.deadline = None
+
+    def frame_seconds(self):
+        return max(self.MIN_DELAY_MS, self.get_current_delay()) / 1000.0
+
+    def advance(self, now):
+        """前进到 now 时刻应该显示的帧，返回这次跳过的帧数"""
+        if self.deadline is None:
+            self.deadline = now + self.frame_seconds()
+            return 0
+
+        # 落后超过一整轮（例如系统休眠后）时直接从当前帧重新计时
+        loop_seconds = sum(max(self.MIN_DELAY_MS, d) for d in self.gif.delays) / 1000.0
+        if now - self.deadline > loop_seconds:
+            self.deadline = now
+
+        skipped = -1
+        while now + self.EARLY_SECONDS >= self.deadline:
+            self.next_frame()
+            self.deadline += self.frame_seconds()
+            skipped += 1
+        skipped = max(0, skipped)
+        self.dropped += skipped
+        return skipped
+
+    def is_static(self):
+        """只有一帧的图片（PNG/JPG）画一次就不再需要刷新"""
+        return len(self.gif.frames) == 1
+
+    def wait_ms(self, now, min_interval_ms=0):
+        """距离下一帧的毫秒数，不小于 min_interval_ms（更密的帧会被跳过）"""
+        remaining = (self.deadline - now) * 1000 if self.deadline is not None else 0
+        return max(int(min_interval_ms), int(remaining + 0.999))
+
+    def render(self):
+        """把当前帧画到画布上并返回画布"""
+        gif = self.gif
+        width, height = gif.size
+        if self.canvas is None or (self.canvas.width(), self.canvas.height()) != (width, height):
+            self.release()
+            self.canvas = tk.PhotoImage(width=width, height=height)
+            if self.budget is not None:
+                self.budget.canvas_bytes += self.canvas_bytes()
+            self.shown_index = None
+
+        if self.shown_index is None:
+            self.blit(gif.keyframe, 0, 0)
+            self.shown_index = 0
+
+        # 依次叠加变化区域直到目标帧
+        while self.shown_index != self.frame_index:
+            self.shown_index = (self.shown_index + 1) % len(gif.frames)
+            patch = gif.frames[self.shown_index]
+            if patch is not None:
+                self.blit(patch.image, patch.x, patch.y)
+
+        return self.canvas
+
+    def canvas_bytes(self):
+        """画布占用的内存（Tk 图片每个像素4字节）"""
+        if self.canvas is None:
+            return 0
+        return self.canvas.width() * self.canvas.height() * 4
+
+    def release(self):
+        """不再显示时释放画布，下次 render 重新创建"""
+        if self.canvas is not None and self.budget is not None:
+            self.budget.canvas_bytes -= self.canvas_bytes()
+        self.canvas = None
+        self.shown_index = None
+
+    def blit(self, image, x, y):
+        """把图像原样复制到画布的指定位置（包括透明像素）"""
+        self.canvas.tk.call(str(self.canvas), 'copy', str(image),
+                            '-to', x, y, '-compositingrule', 'set')
 
     def get_current_delay(self):
         """获取当前帧的延迟时间"""
-        return self.delays[self.current_frame]
+        return self.gif.delays[self.frame_index % len(self.gif.delays)]
 
     def next_frame(self):
         """切换到下一帧"""
-        self.current_frame = (self.current_frame + 1) % len(self.frames)
+        self.frame_index = (self.frame_index + 1) % len(self.gif.frames)
+
+
+def preprocess_asset(path):
+    """进程池任务：解码并处理一个图片文件，返回原始RGBA数据（不涉及Tk）"""
+    images, delays = AnimatedGif(path).decode_frames(path)
+    width, height = images[0].size
+    return width, height, delays, [img.tobytes() for img in images]
+
+
+class AssetPreloader:
+    """用进程池并行预处理所有图片，结果通过队列交给Tk主线程创建PhotoImage"""
+
+    def __init__(self, gifs, frame_cache, max_workers=None):
+        self.gifs = list(gifs)
+        self.frame_cache = frame_cache
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.results = queue.Queue()  # (动画, RGBA帧列表或None, 延迟列表, 错误)
+        self.executor = None
+        self.futures = {}
+        self.finished = False
+
+        for gif in self.gifs:
+            gif.pending = True
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def stop(self):
+        """退出时取消尚未开始的任务"""
+        for future in self.futures:
+            future.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+    def run(self):
+        delivered = set()
+        try:
+            # 已有缓存的图片不需要进程池，用到时直接从磁盘读取
+            todo = {}
+            for gif in self.gifs:
+                try:
+                    key = gif.cache_key(self.frame_cache)
+                except Exception as e:
+                    self.deliver(gif, None, None, e, delivered)
+                    continue
+                if self.frame_cache.contains(key):
+                    self.deliver(gif, None, None, None, delivered)
+                else:
+                    todo[gif] = key
+
+            if not todo:
+                return
+
+            print(f"使用 {min(self.max_workers, len(todo))} 个进程预处理 {len(todo)} 个图片")
+            # 本进程已有多个线程，fork 出的子进程可能卡在别的线程持有的锁上，统一用 spawn 启动
+            self.executor = ProcessPoolExecutor(max_workers=min(self.max_workers, len(todo)),
+                                                mp_context=multiprocessing.get_context('spawn'))
+            self.futures = {self.executor.submit(preprocess_asset, gif.path): gif for gif in todo}
+
+            for future in as_completed(self.futures):
+                gif = self.futures[future]
+                try:
+                    width, height, delays, buffers = future.result()
+                    images = [Image.frombytes('RGBA', (width, height), buf) for buf in buffers]
+                    self.frame_cache.put(todo[gif], gif.path, images, delays)
+                    self.frame_cache.save()
+                    self.deliver(gif, images, delays, None, delivered)
+                except Exception as e:
+                    self.deliver(gif, None, None, e, delivered)
+
+        except Exception as e:
+            print(f"并行预处理失败，改为按需加载: {e}")
+        finally:
+            # 没有结果的动画交回主线程按需加载
+            for gif in self.gifs:
+                if gif not in delivered:
+                    self.deliver(gif, None, None, None, delivered)
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+            self.finished = True
+
+    def deliver(self, gif, images, delays, error, delivered):
+        delivered.add(gif)
+        self.results.put((gif, images, delays, error))
+
+
+class AssetBundle:
+    """预编译资源包，只读映射到内存，直接从映射内存创建帧
+
+    文件结构：文件头 | 所有帧的RGBA数据 | JSON索引表
+    文件头为 标识、流水线版本、索引偏移、索引长度
+    """
+
+    MAGIC = b'DPB1'
+    HEADER = struct.Struct('<4sIQI')
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, index_offset, index_size = self.HEADER.unpack_from(self.mm, 0)
+        if magic != self.MAGIC:
+            raise ValueError("不是有效的资源包")
+        if version != PIPELINE_VERSION:
+            raise ValueError(f"资源包版本 {version} 已过期，请重新生成")
+
+        index = json.loads(self.mm[index_offset:index_offset + index_size].decode('utf-8'))
+        if tuple(index['frame_size']) != FRAME_SIZE:
+            raise ValueError("资源包帧尺寸与当前设置不一致，请重新生成")
+        self.entries = index['entries']  # [{'name', 'width', 'height', 'delays', 'offset'}]
+        self.view = memoryview(self.mm)
+
+    def read_frames(self, entry):
+        """返回 (RGBA图片列表, 延迟列表)，图片与映射内存共享数据，不复制"""
+        width, height = entry['width'], entry['height']
+        frame_bytes = width * height * 4
+        images = []
+        for i in range(len(entry['delays'])):
+            start = entry['offset'] + i * frame_bytes
+            images.append(Image.frombuffer('RGBA', (width, height),
+                                           self.view[start:start + frame_bytes], 'raw', 'RGBA', 0, 1))
+        return images, list(entry['delays'])
+
+
+class BundledAnimation(AnimatedGif):
+    """来自预编译资源包的动画，无需解码和缓存"""
+
+    def __init__(self, bundle, entry, frame_budget=None):
+        super().__init__(entry['name'], None, frame_budget)
+        self.bundle = bundle
+        self.entry = entry
+
+    def load_frames(self, path, frame_cache=None):
+        return self.bundle.read_frames(self.entry)
+
+
+class GeneratedAnimation(AnimatedGif):
+    """程序生成的动画（如默认动画），不计入内存预算"""
+
+    def __init__(self, name, images, delays):
+        super().__init__(name)
+        self.generated = (images, delays)
+
+    def load_frames(self, path, frame_cache=None):
+        return self.generated
+
+
+def build_asset_bundle(image_dir="tupian", bundle_path=BUNDLE_PATH):
+    """把图片文件夹预处理并打包成一个资源包文件"""
+    image_files = sorted(f for f in os.listdir(image_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+    paths = [os.path.join(image_dir, f) for f in image_files]
+    entries = []
+
+    tmp_path = bundle_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        # 先写占位文件头，索引写完后再回填
+        f.write(AssetBundle.HEADER.pack(AssetBundle.MAGIC, PIPELINE_VERSION, 0, 0))
+
+        with ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [executor.submit(preprocess_asset, path) for path in paths]
+            for img_file, future in zip(image_files, futures):
+                try:
+                    width, height, delays, buffers = future.result()
+                except Exception as e:
+                    print(f"处理图片 {img_file} 失败，已跳过: {e}")
+                    continue
+
+                entries.append({
+                    'name': img_file,
+                    'width': width,
+                    'height': height,
+                    'delays': delays,
+                    'offset': f.tell()
+                })
+                for buf in buffers:
+                    f.write(buf)
+                print(f"已打包: {img_file} (帧数: {len(buffers)})")
+
+        index = json.dumps({'frame_size': list(FRAME_SIZE), 'entries': entries}).encode('utf-8')
+        index_offset = f.tell()
+        f.write(index)
+        f.seek(0)
+        f.write(AssetBundle.HEADER.pack(AssetBundle.MAGIC, PIPELINE_VERSION, index_offset, len(index)))
+
+    os.replace(tmp_path, bundle_path)
+    print(f"资源包已生成: {bundle_path} ({len(entries)} 个动画)")
+
+
+class AssetWatcher:
+    """监视图片文件夹的变化，Linux 上使用 inotify，其他系统或失败时定时扫描
+
+    inotify 的文件描述符只由监视线程打开和关闭。stop() 不能直接关闭它：关闭不会唤醒阻塞中的
+    read，而且同一个编号可能马上分配给别的文件。所以监视线程同时等待一个管道，stop() 往管道里写一个字节
+    """
+
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_DELETE = 0x200
+    IN_IGNORED = 0x8000  # 被监视的文件夹本身已删除
+    EVENT = struct.Struct('iIII')  # wd, mask, cookie, len
+
+    def __init__(self, image_dir, poll_interval=2.0):
+        self.image_dir = image_dir
+        self.poll_interval = poll_interval
+        self.changes = queue.Queue()  # 发生变化的文件名
+        self.lock = threading.Lock()  # 保护 wake_fd，避免 stop() 写入已关闭的管道
+        self.wake_fd = None  # 唤醒管道的写入端，只在 watch_inotify 运行期间有效
+        self.stopped = False
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            if self.wake_fd is not None:
+                try:
+                    os.write(self.wake_fd, b'\0')
+                except OSError:
+                    pass
+
+    def run(self):
+        if sys.platform.startswith('linux'):
+            try:
+                self.watch_inotify()
+            except Exception as e:
+                print(f"inotify 不可用，改为定时扫描图片文件夹: {e}")
+        if not self.stopped:
+            self.watch_polling()
+
+    def report(self, name):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            self.changes.put(name)
+
+    def watch_inotify(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        wake_read, wake_write = os.pipe()
+        with self.lock:
+            self.wake_fd = wake_write
+
+        try:
+            mask = self.IN_CLOSE_WRITE | self.IN_MOVED_FROM | self.IN_MOVED_TO | self.IN_DELETE
+            if libc.inotify_add_watch(fd, os.fsencode(self.image_dir), mask) < 0:
+                raise OSError(ctypes.get_errno(), "inotify_add_watch 失败")
+
+            while not self.stopped:
+                readable, _, _ = select.select([fd, wake_read], [], [])
+                if wake_read in readable:
+                    return  # stop() 唤醒
+                data = os.read(fd, 64 * 1024)
+
+                offset = 0
+                while offset < len(data):
+                    _, event_mask, _, name_len = self.EVENT.unpack_from(data, offset)
+                    offset += self.EVENT.size
+                    name = os.fsdecode(data[offset:offset + name_len].rstrip(b'\0'))
+                    offset += name_len
+
+                    if event_mask & self.IN_IGNORED:
+                        return  # 文件夹被删除或移走，交给定时扫描处理
+                    if name:
+                        self.report(name)
+        finally:
+            with self.lock:
+                self.wake_fd = None
+            os.close(wake_write)
+            os.close(wake_read)
+            os.close(fd)
+
+    def watch_polling(self):
+        def snapshot():
+            try:
+                with os.scandir(self.image_dir) as entries:
+                    return {e.name: (e.stat().st_mtime_ns, e.stat().st_size)
+                            for e in entries if e.is_file()}
+            except OSError:
+                return {}
+
+        previous = snapshot()
+        while not self.stopped:
+            time.sleep(self.poll_interval)
+            current = snapshot()
+            for name in set(previous) | set(current):
+                if previous.get(name) != current.get(name):
+                    self.report(name)
+            previous = current
+
+
+class TimerHandle:
+    """定时任务的句柄，可用于取消任务"""
+
+    __slots__ = ('scheduler', 'due', 'priority', 'callback', 'name', 'cancelled', 'fired')
+
+    def __init__(self, scheduler, due, priority, callback, name=None):
+        self.scheduler = scheduler
+        self.due = due  # time.monotonic() 时间
+        self.priority = priority
+        self.callback = callback
+        self.name = name
+        self.cancelled = False
+        self.fired = False
+
+    @property
+    def active(self):
+        """任务仍在等待执行"""
+        return not (self.cancelled or self.fired)
+
+    def cancel(self):
+        self.scheduler.cancel(self)
+
+
+class TickScheduler:
+    """集中的定时调度器
+
+    所有定时任务按到期时间放在一个堆里，Tk 中始终只挂一个 after 回调，
+    触发时按优先级依次执行所有已到期的任务，代替每个任务各自的 root.after 链
+    只能在Tk主线程中使用，后台线程仍然用 root.after 把工作交回主线程
+
+    任务可以带名称，同名任务同一时间只会有一个在等待：再次登记时默认什么都不做，
+    replace=True 时取消旧任务重新登记。名称形如 "类别" 或 "类别:实例"
+    """
+
+    PRIORITY_RENDER = 20  # 动画帧、淡入淡出
+    PRIORITY_MOTION = 10  # 移动
+    PRIORITY_NORMAL = 0
+    PRIORITY_BACKGROUND = -10  # 对话、整点检查等可以稍晚执行的任务
+
+    def __init__(self, root, tolerance_ms=2, monitor=None):
+        self.root = root
+        self.tolerance = tolerance_ms / 1000.0  # 差这么多就到期的任务合并到同一轮执行
+        self.monitor = monitor  # FrameTimeMonitor，记录每轮的延迟和耗时
+        self.heap = []  # (到期时间, -优先级, 序号, 句柄)
+        self.counter = itertools.count()
+        self.after_id = None
+        self.armed_due = None
+        self.in_tick = False
+        self.named = {}  # 名称 -> 等待中的句柄
+
+    def after(self, delay_ms, callback, priority=PRIORITY_NORMAL, name=None, replace=False):
+        """delay_ms 毫秒后执行 callback，返回可取消的句柄
+
+        同名任务已在等待时：replace=False 直接返回已有句柄，replace=True 取消旧任务
+        """
+        if name is not None:
+            existing = self.named.get(name)
+            if existing is not None and existing.active:
+                if not replace:
+                    return existing
+                self.cancel(existing)
+
+        handle = TimerHandle(self, time.monotonic() + delay_ms / 1000.0, priority, callback, name)
+        heapq.heappush(self.heap, (handle.due, -priority, next(self.counter), handle))
+        if name is not None:
+            self.named[name] = handle
+        if not self.in_tick:
+            self.arm()
+        return handle
+
+    def cancel(self, handle):
+        """取消任务，堆中的条目在出堆时再丢弃"""
+        handle.cancelled = True
+        self.forget(handle)
+
+    def cancel_name(self, name):
+        """按名称取消等待中的任务"""
+        handle = self.named.get(name)
+        if handle is not None:
+            self.cancel(handle)
+
+    def forget(self, handle):
+        if handle.name is not None and self.named.get(handle.name) is handle:
+            del self.named[handle.name]
+
+    def pending_count(self):
+        return sum(1 for entry in self.heap if entry[3].active)
+
+    def live_counts(self):
+        """每类任务当前等待执行的数量，用于发现重复启动的循环"""
+        counts = {}
+        for entry in self.heap:
+            handle = entry[3]
+            if handle.active:
+                if handle.name is not None:
+                    kind = handle.name.split(':')[0]
+                else:
+                    kind = getattr(handle.callback, '__name__', repr(handle.callback))
+                counts[kind] = counts.get(kind, 0) + 1
+        return counts
+
+    def live_count(self, kind):
+        return self.live_counts().get(kind, 0)
+
+    def arm(self):
+        """让 Tk 的唯一回调在最早的任务到期时触发"""
+        while self.heap and not self.heap[0][3].active:
+            heapq.heappop(self.heap)
+
+        if not self.heap:
+            self.disarm()
+            return
+
+        due = self.heap[0][0]
+        if self.after_id is not None:
+            if self.armed_due <= due:
+                return
+            self.disarm()
+
+        delay = max(0, int((due - time.monotonic()) * 1000 + 0.999))
+        self.armed_due = due
+        self.after_id = self.root.after(delay, self.tick)
+
+    def disarm(self):
+        if self.after_id is not None:
+            try:
+                self.root.after_cancel(self.after_id)
+            except tk.TclError:
+                pass
+        self.after_id = None
+        self.armed_due = None
+
+    def tick(self):
+        """执行所有已到期的任务"""
+        self.after_id = None
+        self.armed_due = None
+        self.in_tick = True
+        started = time.monotonic()
+        try:
+            now = started + self.tolerance
+            due_jobs = []
+            while self.heap and self.heap[0][0] <= now:
+                handle = heapq.heappop(self.heap)[3]
+                if handle.active:
+                    due_jobs.append(handle)
+
+            # 同一轮中优先级高的先执行
+            due_jobs.sort(key=lambda h: -h.priority)
+            for handle in due_jobs:
+                if not handle.active:
+                    continue  # 被同一轮中先执行的任务取消了
+                handle.fired = True
+                self.forget(handle)
+                try:
+                    handle.callback()
+                except Exception as e:
+                    print(f"定时任务 {handle.name or handle.callback} 执行失败: {e}")
+
+            if self.monitor is not None and due_jobs:
+                # 延迟：最早到期的任务晚了多久才执行；耗时：这一轮所有任务的执行时间
+                lateness = max(0.0, started - min(handle.due for handle in due_jobs))
+                self.monitor.record(lateness * 1000, (time.monotonic() - started) * 1000)
+        finally:
+            self.in_tick = False
+            self.arm()
+
+    def stop(self):
+        """取消所有任务"""
+        for entry in self.heap:
+            entry[3].cancelled = True
+        self.heap.clear()
+        self.named.clear()
+        self.disarm()
+
+
+def percentile(values, p):
+    """values 的第 p 百分位数（最近秩法），values 为空时返回 0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100.0))]
+
+
+class FrameTimeMonitor:
+    """统计主循环定时回调的延迟和每轮耗时，超出预算时逐级降低画质，有余量后逐级恢复
+
+    画质等级越高越省：分身更少、动画刷新间隔更大，等级1起对话框不再淡入淡出
+    """
+
+    LEVELS = [
+        # 名称、分身上限、动画刷新间隔倍数、是否跳过淡入淡出
+        ('流畅', None, 1.0, False),
+        ('降低', 20, 1.5, True),
+        ('较低', 10, 2.0, True),
+        ('最低', 3, 3.0, True),
+    ]
+
+    def __init__(self, lateness_budget_ms=40, work_budget_ms=25, window=300):
+        self.lateness_budget = lateness_budget_ms  # 回调延迟 p95 的预算
+        self.work_budget = work_budget_ms  # 每轮耗时 p95 的预算
+        self.lateness = deque(maxlen=window)
+        self.work = deque(maxlen=window)
+        self.level = 0
+        self.calm_checks = 0  # 连续有余量的检查次数
+
+    def record(self, lateness_ms, work_ms):
+        self.lateness.append(lateness_ms)
+        self.work.append(work_ms)
+
+    def stats(self):
+        """返回 (延迟p50, 延迟p95, 耗时p95)，单位毫秒"""
+        return (percentile(self.lateness, 50), percentile(self.lateness, 95),
+                percentile(self.work, 95))
+
+    @property
+    def label(self):
+        return self.LEVELS[self.level][0]
+
+    @property
+    def clone_limit(self):
+        return self.LEVELS[self.level][1]
+
+    @property
+    def frame_scale(self):
+        return self.LEVELS[self.level][2]
+
+    @property
+    def skip_fades(self):
+        return self.LEVELS[self.level][3]
+
+    def evaluate(self, min_samples=20):
+        """根据最近的统计调整画质等级，等级变化时返回新等级，否则返回 None"""
+        if len(self.lateness) < min_samples:
+            return None
+        _, late_p95, work_p95 = self.stats()
+
+        if late_p95 > self.lateness_budget or work_p95 > self.work_budget:
+            self.calm_checks = 0
+            if self.level < len(self.LEVELS) - 1:
+                return self.change(self.level + 1, late_p95, work_p95)
+        elif late_p95 < self.lateness_budget / 2 and work_p95 < self.work_budget / 2:
+            # 连续两次都有余量才恢复，避免来回跳动
+            self.calm_checks += 1
+            if self.calm_checks >= 2 and self.level > 0:
+                self.calm_checks = 0
+                return self.change(self.level - 1, late_p95, work_p95)
+        else:
+            self.calm_checks = 0
+        return None
+
+    def change(self, level, late_p95, work_p95):
+        old = self.label
+        self.level = level
+        # 旧的样本反映的是调整前的负载
+        self.lateness.clear()
+        self.work.clear()
+        print(f"画质: {old} -> {self.label}（延迟p95 {late_p95:.0f}ms，耗时p95 {work_p95:.0f}ms）")
+        return level
+
+
+def ease_in_out(t):
+    """先加速后减速"""
+    return t * t * (3 - 2 * t)
+
+
+class Tween:
+    __slots__ = ('target', 'setter', 'start', 'end', 'duration', 'started', 'easing', 'on_done')
+
+    def __init__(self, target, setter, start, end, duration, started, easing, on_done):
+        self.target = target
+        self.setter = setter
+        self.start = start
+        self.end = end
+        self.duration = duration
+        self.started = started
+        self.easing = easing
+        self.on_done = on_done
+
+    def value(self, progress):
+        return self.start + (self.end - self.start) * self.easing(progress)
+
+
+class TweenEngine:
+    """所有淡入淡出补间共用一个定时任务，每一轮批量更新
+
+    补间按实际经过的时间计算进度，系统繁忙时总时长不变，只是中间的步数变少。
+    同一窗口的同一种补间（如透明度）同时只有一个，新补间会替换旧的；
+    窗口被销毁后对应的补间自动丢弃
+    """
+
+    def __init__(self, scheduler, interval_ms=30):
+        self.scheduler = scheduler
+        self.interval_ms = interval_ms
+        self.tweens = {}  # (窗口, 属性) -> Tween
+
+    def __len__(self):
+        return len(self.tweens)
+
+    def start(self, target, prop, setter, start, end, duration_ms, easing=ease_in_out, on_done=None):
+        self.tweens[(target, prop)] = Tween(target, setter, start, end, duration_ms / 1000.0,
+                                            time.monotonic(), easing, on_done)
+        self.scheduler.after(0, self.tick, TickScheduler.PRIORITY_RENDER, name='tweens')
+
+    def fade(self, window, start, end, duration_ms=300, easing=ease_in_out, on_done=None):
+        """改变窗口透明度"""
+        setter = lambda alpha: window.attributes('-alpha', alpha)
+        self.start(window, 'alpha', setter, start, end, duration_ms, easing, on_done)
+
+    def cancel(self, target, prop=None):
+        """取消窗口的补间，prop 为 None 时取消该窗口的所有补间"""
+        for key in [key for key in self.tweens if key[0] is target and prop in (None, key[1])]:
+            del self.tweens[key]
+
+    def tick(self):
+        now = time.monotonic()
+        finished = []
+        for key, tween in list(self.tweens.items()):
+            if self.tweens.get(key) is not tween:
+                continue  # 被同一轮中先执行的回调替换或取消了
+            progress = 1.0 if tween.duration <= 0 else min(1.0, (now - tween.started) / tween.duration)
+            try:
+                tween.setter(tween.value(progress))
+            except tk.TclError:
+                del self.tweens[key]  # 窗口已销毁
+                continue
+            if progress >= 1.0:
+                del self.tweens[key]
+                finished.append(tween)
+
+        for tween in finished:
+            if tween.on_done is not None:
+                try:
+                    tween.on_done()
+                except Exception as e:
+                    print(f"补间结束回调失败: {e}")
+
+        if self.tweens:
+            self.scheduler.after(self.interval_ms, self.tick, TickScheduler.PRIORITY_RENDER, name='tweens')
+
+    def stop(self):
+        self.tweens.clear()
+        self.scheduler.cancel_name('tweens')
+
+
+def random_speed():
+    """随机的移动速度（像素/秒），相当于原来每50毫秒走1-2像素"""
+    return random.choice([-40, -20, 20, 40])
+
+
+class MotionClock:
+    """测量两次移动之间实际经过的时间，移动距离 = 速度 × 时间，与刷新频率无关"""
+
+    def __init__(self, max_step=0.25):
+        self.max_step = max_step  # 卡顿很久后只补这么多秒，避免一步跳过半个屏幕
+        self.last = None
+
+    def elapsed(self):
+        now = time.monotonic()
+        dt = 0.0 if self.last is None else min(now - self.last, self.max_step)
+        self.last = now
+        return dt
+
+    def reset(self):
+        self.last = None
+
+
+def user_idle_seconds():
+    """用户多久没有操作键盘鼠标（秒），无法获取时返回 None"""
+    if sys.platform != 'win32':
+        return None
+    try:
+        class LASTINPUTINFO(ctypes.Structure):
+            _fields_ = [('cbSize', ctypes.c_uint), ('dwTime', ctypes.c_uint)]
+
+        info = LASTINPUTINFO()
+        info.cbSize = ctypes.sizeof(info)
+        if not ctypes.windll.user32.GetLastInputInfo(ctypes.byref(info)):
+            return None
+        millis = (ctypes.windll.kernel32.GetTickCount() - info.dwTime) & 0xFFFFFFFF
+        return millis / 1000.0
+    except Exception:
+        return None
+
+
+# 一次系统状态采样的结果，创建后不再修改，界面代码可以直接读取
+MetricsSnapshot = namedtuple('MetricsSnapshot', [
+    'time',  # 采样时间（time.time()）
+    'cpu_percent',  # 总CPU使用率
+    'cpu_per_core',  # 每个核心的使用率（元组）
+    'memory_percent',
+    'memory_used',  # 字节
+    'memory_total',
+    'disk_percent',
+    'process_count',
+    'battery',  # psutil.sensors_battery() 的结果，没有电池时为 None
+    'idle_seconds',  # 用户空闲时间，无法获取时为 None
+])
+
+EMPTY_METRICS = MetricsSnapshot(0, 0.0, (), 0.0, 0, 0, 0.0, 0, None, None)
+
+
+class MetricsSampler:
+    """在后台线程中定时采集系统状态，主线程只读取最新的快照，不调用 psutil
+
+    快照是不可变的元组，发布时直接替换 snapshot 属性，读取不需要加锁
+    """
+
+    def __init__(self, period=2.0, disk_path='/', recorders=()):
+        self.period = period
+        self.disk_path = disk_path
+        self.recorders = list(recorders)  # 每次采样后调用 record(快照)，如 MetricsHistory、MetricsDatabase
+        self.snapshot = EMPTY_METRICS
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    @property
+    def ready(self):
+        return self.snapshot is not EMPTY_METRICS
+
+    def run(self):
+        # cpu_percent(interval=None) 返回距上次调用的平均值，第一次调用只是开始计时
+        psutil.cpu_percent(interval=None)
+        psutil.cpu_percent(interval=None, percpu=True)
+        while not self.stop_event.wait(self.period):
+            try:
+                self.snapshot = self.sample()
+                for recorder in self.recorders:
+                    recorder.record(self.snapshot)
+            except Exception as e:
+                print(f"采集系统信息失败: {e}")
+
+    def sample(self):
+        memory = psutil.virtual_memory()
+        try:
+            disk_percent = psutil.disk_usage(self.disk_path).percent
+        except OSError:
+            disk_percent = 0.0
+        try:
+            battery = psutil.sensors_battery()
+        except Exception:
+            battery = None
+        return MetricsSnapshot(
+            time=time.time(),
+            cpu_percent=psutil.cpu_percent(interval=None),
+            cpu_per_core=tuple(psutil.cpu_percent(interval=None, percpu=True)),
+            memory_percent=memory.percent,
+            memory_used=memory.used,
+            memory_total=memory.total,
+            disk_percent=disk_percent,
+            process_count=len(psutil.pids()),
+            battery=battery,
+            idle_seconds=user_idle_seconds(),
+        )
+
+
+class MetricTier:
+    """一种时间精度的环形缓冲区，每个时间段保存开始时间、样本数、总和、最小值和最大值
+
+    内存大小固定，追加是 O(1)；最新的时间段还在累加中，查询时一并计入
+    """
+
+    def __init__(self, resolution, capacity):
+        self.resolution = resolution  # 每个时间段的秒数
+        self.capacity = capacity
+        self.starts = array('d', [0.0]) * capacity
+        self.counts = array('d', [0.0]) * capacity
+        self.sums = array('d', [0.0]) * capacity
+        self.lows = array('d', [0.0]) * capacity
+        self.highs = array('d', [0.0]) * capacity
+        self.head = -1  # 最新时间段的位置
+        self.size = 0
+
+    @property
+    def span(self):
+        """能保存多长时间（秒）"""
+        return self.resolution * self.capacity
+
+    def add(self, timestamp, value):
+        start = timestamp - timestamp % self.resolution
+        head = self.head
+        if head < 0 or start > self.starts[head]:
+            # 开始新的时间段，覆盖最旧的一个
+            head = self.head = (head + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+            self.starts[head] = start
+            self.counts[head] = 1
+            self.sums[head] = self.lows[head] = self.highs[head] = value
+        else:
+            self.counts[head] += 1
+            self.sums[head] += value
+            self.lows[head] = min(self.lows[head], value)
+            self.highs[head] = max(self.highs[head], value)
+
+    def buckets(self, since):
+        """从旧到新返回 since 之后的时间段 (开始时间, 样本数, 总和, 最小值, 最大值)"""
+        result = []
+        for age in range(self.size):
+            i = (self.head - age) % self.capacity
+            if self.starts[i] + self.resolution <= since:
+                break
+            result.append((self.starts[i], self.counts[i], self.sums[i], self.lows[i], self.highs[i]))
+        result.reverse()
+        return result
+
+
+class MetricsHistory:
+    """系统状态的多精度时间序列：默认 1秒×10分钟、1分钟×24小时、1小时×30天
+
+    每个样本同时累加到每一级，查询时使用能覆盖整个时间范围的最精细的一级
+    """
+
+    SERIES = ('cpu', 'memory', 'disk', 'processes')
+    SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+    def __init__(self, tiers=((1, 600), (60, 1440), (3600, 720))):
+        self.tier_specs = tiers
+        self.tiers = {name: [MetricTier(resolution, capacity) for resolution, capacity in tiers]
+                      for name in self.SERIES}
+        self.lock = threading.Lock()  # 采集线程写入，主线程查询
+
+    def record(self, metrics):
+        """记录一个 MetricsSnapshot"""
+        values = {
+            'cpu': metrics.cpu_percent,
+            'memory': metrics.memory_percent,
+            'disk': metrics.disk_percent,
+            'processes': metrics.process_count,
+        }
+        with self.lock:
+            for name, value in values.items():
+                for tier in self.tiers[name]:
+                    tier.add(metrics.time, float(value))
+
+    def buckets(self, name, seconds, now=None):
+        now = time.time() if now is None else now
+        tiers = self.tiers[name]
+        tier = next((t for t in tiers if t.span >= seconds), tiers[-1])
+        with self.lock:
+            return tier.buckets(now - seconds)
+
+    def average(self, name, seconds, now=None):
+        """最近 seconds 秒的平均值，没有数据时返回 None"""
+        buckets = self.buckets(name, seconds, now)
+        count = sum(b[1] for b in buckets)
+        return sum(b[2] for b in buckets) / count if count else None
+
+    def peak(self, name, seconds, now=None):
+        """最近 seconds 秒的最大值，没有数据时返回 None"""
+        return max((b[4] for b in self.buckets(name, seconds, now)), default=None)
+
+    def lowest(self, name, seconds, now=None):
+        return min((b[3] for b in self.buckets(name, seconds, now)), default=None)
+
+    def sparkline(self, name, seconds, width=20, now=None):
+        """最近 seconds 秒的走势，用方块字符画成一行"""
+        now = time.time() if now is None else now
+        buckets = self.buckets(name, seconds, now)
+        if not buckets:
+            return ""
+        # 按时间均分成 width 列，每列取平均值
+        start = now - seconds
+        columns = [[0.0, 0.0] for _ in range(width)]
+        for bucket_start, count, total, _, _ in buckets:
+            column = min(width - 1, max(0, int((bucket_start - start) / seconds * width)))
+            columns[column][0] += total
+            columns[column][1] += count
+        values = [total / count for total, count in columns if count]
+        low, high = min(values), max(values)
+        scale = (len(self.SPARK_CHARS) - 1) / (high - low) if high > low else 0
+        return "".join(self.SPARK_CHARS[int((v - low) * scale)] for v in values)
+
+
+# 一个进程在最近一次采样中的资源占用，cpu 已按核心数换算成占整机的百分比
+ProcessInfo = namedtuple('ProcessInfo', 'pid name cpu rss io_rate')
+# 各项资源占用最多的进程，每项是 ProcessInfo 的元组
+ProcessTop = namedtuple('ProcessTop', 'time cpu memory io')
+
+EMPTY_PROCESS_TOP = ProcessTop(0, (), (), ())
+
+
+class ProcessState:
+    """一个进程在两次采样之间保留的状态"""
+
+    __slots__ = ('proc', 'name', 'cpu_seconds', 'cpu_time', 'rss', 'io_bytes', 'io_time', 'io_rate')
+
+    def __init__(self, proc, name):
+        self.proc = proc  # process_iter 缓存的 Process 对象，PID 被重用时会换成新对象
+        self.name = name
+        self.cpu_seconds = None  # 上次读取的累计CPU时间
+        self.cpu_time = 0.0
+        self.rss = 0
+        self.io_bytes = None  # 上次读取的读写字节数
+        self.io_time = 0.0
+        self.io_rate = 0.0  # 最近一次计算的读写速率（字节/秒）
+
+
+class ProcessTracker:
+    """在采集线程中统计各进程的CPU、内存和读写，维护占用最多的前 top_n 个进程
+
+    process_iter 会缓存 Process 对象，每次采样每个进程只读取一次累计CPU时间，
+    CPU使用率由两次采样之间的差值算出。名称只在第一次见到某个进程时读取；
+    内存和读写字节数变化较慢，每个进程每 slow_every 次采样读取一次（按 PID 错开），中间沿用上次的值。
+    进程退出后删除其状态，PID 被新进程重用时 process_iter 会给出新的 Process 对象，
+    据此重新开始统计。
+    PID 0 不参与统计：Windows 上它是“System Idle Process”，CPU时间就是整机的空闲时间
+    """
+
+    def __init__(self, top_n=5, slow_every=5):
+        self.top_n = top_n
+        self.slow_every = slow_every
+        self.states = {}  # pid -> ProcessState
+        self.rounds = 0
+        self.cpu_count = psutil.cpu_count() or 1
+        self.top = EMPTY_PROCESS_TOP
+        self.last_cost_ms = 0.0  # 最近一次采样的耗时
+
+    def record(self, metrics):
+        """作为 MetricsSampler 的记录器，每次采样时更新"""
+        self.sample()
+
+    def sample(self):
+        started = time.perf_counter()
+        now = time.monotonic()
+        rounds = self.rounds
+        self.rounds += 1
+        seen = {}
+        infos = []
+
+        for proc in psutil.process_iter():
+            pid = proc.pid
+            if pid == 0:
+                continue  # 空闲进程，不是真正占用CPU的程序
+            state = self.states.get(pid)
+            try:
+                if state is None or state.proc is not proc:
+                    state = ProcessState(proc, proc.name() or str(pid))
+                    self.update_slow(state, proc, now)
+                elif (pid + rounds) % self.slow_every == 0:
+                    # 按 PID 错开，每次采样只读取一部分进程，耗时保持平稳
+                    self.update_slow(state, proc, now)
+                cpu = self.update_cpu(state, proc, now)
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                continue  # 进程刚刚退出
+            except psutil.AccessDenied:
+                if state is None or state.proc is not proc:
+                    continue  # 连名称都无法读取
+                cpu = 0.0  # 没有权限读取的系统进程
+
+            seen[pid] = state
+            infos.append(ProcessInfo(pid, state.name, cpu, state.rss, state.io_rate))
+
+        # 已退出的进程不会出现在 seen 中，状态随之丢弃
+        self.states = seen
+        self.top = ProcessTop(
+            time.time(),
+            tuple(heapq.nlargest(self.top_n, infos, key=lambda p: p.cpu)),
+            tuple(heapq.nlargest(self.top_n, infos, key=lambda p: p.rss)),
+            tuple(heapq.nlargest(self.top_n, infos, key=lambda p: p.io_rate)),
+        )
+        self.last_cost_ms = (time.perf_counter() - started) * 1000
+        return self.top
+
+    def update_cpu(self, state, proc, now):
+        """返回距上次采样的CPU使用率（占整机的百分比），第一次采样返回0"""
+        times = proc.cpu_times()
+        seconds = times.user + times.system
+        percent = 0.0
+        if state.cpu_seconds is not None and now > state.cpu_time:
+            percent = max(0.0, seconds - state.cpu_seconds) / (now - state.cpu_time) * 100 / self.cpu_count
+        state.cpu_seconds = seconds
+        state.cpu_time = now
+        return percent
+
+    def update_slow(self, state, proc, now):
+        """读取内存和读写字节数"""
+        state.rss = proc.memory_info().rss
+        try:
+            io = proc.io_counters()
+        except (psutil.AccessDenied, AttributeError, NotImplementedError):
+            return  # 没有权限或系统不支持
+        io_bytes = io.read_bytes + io.write_bytes
+        if state.io_bytes is not None and now > state.io_time:
+            state.io_rate = max(0, io_bytes - state.io_bytes) / (now - state.io_time)
+        state.io_bytes = io_bytes
+        state.io_time = now
+
+
+class MetricsDatabase:
+    """把系统状态样本保存到 SQLite（WAL 模式），退出后历史仍然保留
+
+    采集线程只把样本放进队列，由写入线程攒够一批或每隔 flush_interval 秒一次写入，
+    每次写入后重新计算最近一周的统计供主线程直接读取（ts 上有索引，查询很快）。
+    写入线程每小时把完整小时的原始样本汇总到 rollups 表，删除超过 raw_days 天的原始样本
+    和超过 rollup_days 天的汇总
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS samples (
+            ts REAL NOT NULL,
+            cpu REAL,
+            memory REAL,
+            disk REAL,
+            processes INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_samples_ts ON samples(ts);
+        CREATE TABLE IF NOT EXISTS rollups (
+            resolution INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            samples INTEGER NOT NULL,
+            cpu_avg REAL,
+            cpu_max REAL,
+            memory_avg REAL,
+            memory_max REAL,
+            disk_avg REAL,
+            processes_avg REAL,
+            PRIMARY KEY (resolution, ts)
+        ) WITHOUT ROWID;
+    """
+    HOUR = 3600
+    STOP = object()  # 放进队列让写入线程立即醒来，写完剩余样本后退出
+
+    def __init__(self, path=METRICS_DB_PATH, flush_interval=30.0, batch_size=100, raw_days=2, rollup_days=365):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.raw_days = raw_days
+        self.rollup_days = rollup_days
+        self.pending = queue.Queue()
+        self.thread = None
+        self.last_maintenance = 0.0
+        # 最近一周的统计，写入线程计算好后整体替换，主线程直接读取
+        self.summary = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout=2.0):
+        """停止写入线程，剩余样本写入后再返回"""
+        self.pending.put(self.STOP)
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def record(self, metrics):
+        """由采集线程调用，只放进队列"""
+        self.pending.put((metrics.time, metrics.cpu_percent, metrics.memory_percent,
+                          metrics.disk_percent, metrics.process_count))
+
+    def connect(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=5)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(self.SCHEMA)
+        return connection
+
+    def run(self):
+        try:
+            connection = self.connect()
+        except Exception as e:
+            print(f"打开系统状态数据库失败: {e}")
+            return
+
+        batch = []
+        last_flush = time.monotonic()
+        try:
+            while True:
+                try:
+                    item = self.pending.get(timeout=1.0)
+                except queue.Empty:
+                    item = None
+
+                if item is self.STOP:
+                    # 收下队列中剩余的样本，一次写入后退出
+                    try:
+                        while True:
+                            item = self.pending.get_nowait()
+                            if item is not self.STOP:
+                                batch.append(item)
+                    except queue.Empty:
+                        pass
+                    if batch:
+                        self.flush(connection, batch)
+                    break
+
+                if item is not None:
+                    batch.append(item)
+
+                if batch and (len(batch) >= self.batch_size or
+                              time.monotonic() - last_flush >= self.flush_interval):
+                    self.flush(connection, batch)
+                    batch = []
+                    last_flush = time.monotonic()
+
+                if time.time() - self.last_maintenance >= self.HOUR:
+                    # 先写入手上的样本，避免汇总时漏掉上一小时末尾的数据
+                    if batch:
+                        self.flush(connection, batch)
+                        batch = []
+                        last_flush = time.monotonic()
+                    self.maintain(connection)
+        finally:
+            connection.close()
+
+    def flush(self, connection, batch):
+        try:
+            with connection:
+                connection.executemany("INSERT INTO samples VALUES (?, ?, ?, ?, ?)", batch)
+        except Exception as e:
+            print(f"写入系统状态失败: {e}")
+            return
+        self.refresh_summary(connection)
+
+    def refresh_summary(self, connection):
+        try:
+            self.summary = self.query_summary(connection, 7 * 86400)
+        except Exception as e:
+            print(f"统计系统状态失败: {e}")
+
+    def maintain(self, connection):
+        """汇总完整的小时、清理过期数据，并更新最近一周的统计"""
+        self.last_maintenance = time.time()
+        current_hour = int(self.last_maintenance // self.HOUR * self.HOUR)
+        try:
+            with connection:
+                row = connection.execute("SELECT MAX(ts) FROM rollups WHERE resolution = ?", (self.HOUR,)).fetchone()
+                rolled_until = row[0] + self.HOUR if row[0] is not None else 0
+                connection.execute("""
+                    INSERT OR REPLACE INTO rollups
+                    SELECT ?, CAST(ts / ? AS INTEGER) * ?, COUNT(*), AVG(cpu), MAX(cpu),
+                           AVG(memory), MAX(memory), AVG(disk), AVG(processes)
+                    FROM samples WHERE ts >= ? AND ts < ?
+                    GROUP BY CAST(ts / ? AS INTEGER)
+                """, (self.HOUR, self.HOUR, self.HOUR, rolled_until, current_hour, self.HOUR))
+                connection.execute("DELETE FROM samples WHERE ts < ?",
+                                   (self.last_maintenance - self.raw_days * 86400,))
+                connection.execute("DELETE FROM rollups WHERE ts < ?",
+                                   (self.last_maintenance - self.rollup_days * 86400,))
+        except Exception as e:
+            print(f"整理系统状态数据库失败: {e}")
+        self.refresh_summary(connection)
+
+    def query_summary(self, connection, seconds):
+        """最近 seconds 秒的CPU和内存平均值、峰值（汇总表加上还没汇总的原始样本）"""
+        since = time.time() - seconds
+        row = connection.execute("""
+            SELECT SUM(n), SUM(cpu_sum), MAX(cpu_max), SUM(memory_sum), MAX(memory_max) FROM (
+                SELECT samples AS n, cpu_avg * samples AS cpu_sum, cpu_max,
+                       memory_avg * samples AS memory_sum, memory_max
+                FROM rollups WHERE resolution = ? AND ts >= ?
+                UNION ALL
+                SELECT COUNT(*), SUM(cpu), MAX(cpu), SUM(memory), MAX(memory)
+                FROM samples WHERE ts >= MAX(?, (SELECT COALESCE(MAX(ts) + ?, 0) FROM rollups WHERE resolution = ?))
+            )
+        """, (self.HOUR, since, since, self.HOUR, self.HOUR)).fetchone()
+        count, cpu_sum, cpu_max, memory_sum, memory_max = row
+        if not count:
+            return None
+        return {'days': seconds / 86400, 'cpu_avg': cpu_sum / count, 'cpu_max': cpu_max,
+                'memory_avg': memory_sum / count, 'memory_max': memory_max}
+
+
+# 电源策略：动画刷新间隔倍数、移动频率倍数、分身上限、对话间隔倍数
+PowerPolicy = namedtuple('PowerPolicy', 'name label frame_scale motion_scale clone_limit speech_scale')
+
+
+class PowerGovernor:
+    """根据电池、系统CPU负载和用户空闲时间选择电源策略
+
+    切换到更省电的策略立即生效，恢复到更耗电的策略需要连续两次判断一致，避免来回跳动
+    """
+
+    POLICIES = [
+        PowerPolicy('normal', '正常', 1.0, 1.0, None, 1.0),
+        PowerPolicy('saving', '节能', 2.0, 0.75, 30, 1.5),
+        PowerPolicy('low', '省电', 4.0, 0.5, 5, 2.0),
+    ]
+
+    def __init__(self, busy_cpu=70, overload_cpu=90, idle_seconds=120, away_seconds=600, low_battery=20):
+        self.busy_cpu = busy_cpu  # 系统CPU超过这个百分比进入节能
+        self.overload_cpu = overload_cpu  # 超过这个百分比进入省电
+        self.idle_seconds = idle_seconds  # 用户空闲这么久进入节能
+        self.away_seconds = away_seconds  # 用户离开这么久进入省电
+        self.low_battery = low_battery  # 使用电池且电量低于这个百分比进入省电
+        self.policy = self.POLICIES[0]
+        self.reason = "刚启动"
+        self.pending = None  # 等待确认的更耗电策略
+        self.history = []  # 最近的策略变化 (时间, 旧策略, 新策略, 原因)
+
+    def sample(self, metrics):
+        """从系统状态快照中取出电池、CPU负载和空闲时间"""
+        return metrics.battery, metrics.cpu_percent, metrics.idle_seconds
+
+    def choose(self, battery, cpu_percent, idle):
+        """返回 (策略等级, 原因)"""
+        on_battery = battery is not None and battery.power_plugged is False
+        level, reasons = 0, []
+
+        def raise_to(new_level, reason):
+            nonlocal level
+            level = max(level, new_level)
+            reasons.append(reason)
+
+        if on_battery:
+            if battery.percent < self.low_battery:
+                raise_to(2, f"电量低 {battery.percent:.0f}%")
+            else:
+                raise_to(1, f"使用电池 {battery.percent:.0f}%")
+        if cpu_percent >= self.overload_cpu:
+            raise_to(2, f"CPU {cpu_percent:.0f}%")
+        elif cpu_percent >= self.busy_cpu:
+            raise_to(1, f"CPU {cpu_percent:.0f}%")
+        if idle is not None:
+            if idle >= self.away_seconds:
+                raise_to(2, f"空闲 {idle / 60:.0f} 分钟")
+            elif idle >= self.idle_seconds:
+                raise_to(1, f"空闲 {idle / 60:.0f} 分钟")
+
+        return level, "，".join(reasons) or "接通电源且系统空闲"
+
+    def update(self, metrics):
+        """根据系统状态快照重新判断电源策略，策略变化时返回新策略，否则返回 None"""
+        level, reason = self.choose(*self.sample(metrics))
+        current = self.POLICIES.index(self.policy)
+
+        if level < current and self.pending != level:
+            self.pending = level  # 下次判断仍然一致才恢复
+            return None
+        self.pending = None
+        if level == current:
+            self.reason = reason
+            return None
+
+        old = self.policy
+        self.policy = self.POLICIES[level]
+        self.reason = reason
+        self.history = (self.history + [(time.strftime('%H:%M:%S'), old.label, self.policy.label, reason)])[-10:]
+        print(f"电源策略: {old.label} -> {self.policy.label}（{reason}）")
+        return self.policy
+
+
+class CloneSwarm:
+    """所有分身的位置、速度和下次说话时间，按数组集中存放，每个周期批量更新
+
+    安装了 numpy 时使用 numpy 数组做向量化的反弹和限位，否则使用 array 逐个计算。
+    members 中的分身对象与数组下标一一对应
+    """
+
+    def __init__(self, width=150, height=150):
+        self.width = width  # 分身尺寸，所有分身相同
+        self.height = height
+        self.members = []
+        self.clock = MotionClock()
+        self.clear()
+
+    def clear(self):
+        self.members = []
+        self.clock.reset()
+        if NUMPY_AVAILABLE:
+            self.x, self.y, self.dx, self.dy, self.next_speech = (np.zeros(0) for _ in range(5))
+        else:
+            self.x, self.y, self.dx, self.dy, self.next_speech = (array('d') for _ in range(5))
+
+    def __len__(self):
+        return len(self.members)
+
+    def add(self, clone_obj, x, y, dx, dy):
+        """加入一个分身，dx、dy 是速度（像素/秒），新分身马上就会说第一句话"""
+        self.members.append(clone_obj)
+        if NUMPY_AVAILABLE:
+            self.x = np.append(self.x, float(x))
+            self.y = np.append(self.y, float(y))
+            self.dx = np.append(self.dx, float(dx))
+            self.dy = np.append(self.dy, float(dy))
+            self.next_speech = np.append(self.next_speech, 0.0)
+        else:
+            for values, value in ((self.x, x), (self.y, y), (self.dx, dx), (self.dy, dy), (self.next_speech, 0)):
+                values.append(value)
+
+    def remove(self, clone_obj):
+        """移除一个分身，后面的分身下标前移"""
+        i = self.members.index(clone_obj)
+        del self.members[i]
+        if NUMPY_AVAILABLE:
+            self.x, self.y, self.dx, self.dy, self.next_speech = (
+                np.delete(values, i) for values in (self.x, self.y, self.dx, self.dy, self.next_speech))
+        else:
+            for values in (self.x, self.y, self.dx, self.dy, self.next_speech):
+                del values[i]
+
+    def position(self, clone_obj):
+        i = self.members.index(clone_obj)
+        return int(self.x[i]), int(self.y[i])
+
+    def step(self, screen_width, screen_height):
+        """所有分身按上次移动以来经过的时间前进，碰到屏幕边缘反弹，返回整数坐标发生变化的分身下标"""
+        max_x = screen_width - self.width
+        max_y = screen_height - self.height
+        dt = self.clock.elapsed()
+
+        if NUMPY_AVAILABLE:
+            old_x = self.x.astype(np.int64)
+            old_y = self.y.astype(np.int64)
+            self.x += self.dx * dt
+            self.y += self.dy * dt
+            # 边界检测
+            self.dx[(self.x <= 0) | (self.x >= max_x)] *= -1
+            self.dy[(self.y <= 0) | (self.y >= max_y)] *= -1
+            # 限制在屏幕内
+            np.clip(self.x, 0, max_x, out=self.x)
+            np.clip(self.y, 0, max_y, out=self.y)
+            moved = (self.x.astype(np.int64) != old_x) | (self.y.astype(np.int64) != old_y)
+            return np.flatnonzero(moved).tolist()
+
+        moved = []
+        for i in range(len(self.members)):
+            old = (int(self.x[i]), int(self.y[i]))
+            self.x[i] += self.dx[i] * dt
+            self.y[i] += self.dy[i] * dt
+            if self.x[i] <= 0 or self.x[i] >= max_x:
+                self.dx[i] = -self.dx[i]
+            if self.y[i] <= 0 or self.y[i] >= max_y:
+                self.dy[i] = -self.dy[i]
+            self.x[i] = max(0, min(self.x[i], max_x))
+            self.y[i] = max(0, min(self.y[i], max_y))
+            if (int(self.x[i]), int(self.y[i])) != old:
+                moved.append(i)
+        return moved
+
+    def due_speakers(self, now):
+        """到了说话时间的分身下标，并为它们安排下一次（30-60秒后）"""
+        if NUMPY_AVAILABLE:
+            due = np.flatnonzero(self.next_speech <= now).tolist()
+        else:
+            due = [i for i, t in enumerate(self.next_speech) if t <= now]
+        for i in due:
+            self.next_speech[i] = now + random.randint(30, 60)
+        return due
+
+
+class SceneCompositor:
+    """合成模式：主宠物和所有分身都是同一个全屏透明画布上的图像项
+
+    移动只改变画布项的坐标，不需要窗口管理器参与，窗口数量不随分身数量增加
+    """
+
+    def __init__(self, window, width, height):
+        self.canvas = tk.Canvas(window, width=width, height=height, bg='white', highlightthickness=0, bd=0)
+        self.canvas.pack()
+        self.items = {}  # 名称 -> 画布项编号
+        self.images = {}  # 名称 -> 正在显示的图像，防止垃圾回收
+
+    def add(self, name, x, y):
+        self.items[name] = self.canvas.create_image(int(x), int(y), anchor='nw', tags=(name,))
+
+    def set_image(self, name, image):
+        """画布不变时只需更新画布内容，不用重新配置图像项"""
+        if self.images.get(name) is not image:
+            self.canvas.itemconfigure(self.items[name], image=image)
+            self.images[name] = image
+
+    def move(self, name, x, y):
+        self.canvas.coords(self.items[name], int(x), int(y))
+
+    def remove(self, name):
+        item = self.items.pop(name, None)
+        if item is not None:
+            self.canvas.delete(item)
+        self.images.pop(name, None)
+
+
+class SpeechBubble:
+    """主宠物的圆角对话气泡，控件只创建一次，每次显示时重新设置颜色和文字"""
+
+    def __init__(self, master):
+        self.window = tk.Toplevel(master)
+        self.window.withdraw()
+        self.window.overrideredirect(True)
+        self.window.wm_attributes('-topmost', True)
+
+        # 创建主框架 - 使用Frame嵌套实现圆角效果，缩小外边距
+        main_frame = tk.Frame(self.window, bg='#000000')  # 黑色外框模拟阴影
+        main_frame.pack(padx=2, pady=2)
+
+        # 使用多层Frame模拟圆角 - 缩小边距
+        self.outer_frame = tk.Frame(main_frame, bd=0)
+        self.outer_frame.pack(padx=1, pady=1)
+
+        self.inner_frame = tk.Frame(self.outer_frame, bd=0)
+        self.inner_frame.pack(padx=2, pady=2)
+
+        self.label = tk.Label(self.inner_frame, padx=8, pady=6, wraplength=150, justify='center')
+        self.label.pack()
+
+        # 整点报时的装饰线，需要时才显示
+        self.deco_frame = tk.Frame(self.inner_frame, bg='#FFD700', height=1, bd=0)
+
+    def theme(self, message, bg_color, text_color, border_color, special):
+        font_weight = 'bold' if special else 'normal'
+        font_size = 10 if special else 9
+        self.outer_frame.configure(bg=border_color)
+        self.inner_frame.configure(bg=bg_color)
+        self.label.configure(text=message, bg=bg_color, fg=text_color,
+                             font=('Microsoft YaHei UI', font_size, font_weight))
+        if special:
+            self.deco_frame.pack(fill='x', pady=(3, 0))
+        else:
+            self.deco_frame.pack_forget()
+
+
+class CloneBubble:
+    """分身的小对话框"""
+
+    def __init__(self, master):
+        self.window = tk.Toplevel(master)
+        self.window.withdraw()
+        self.window.overrideredirect(True)
+        self.window.wm_attributes('-topmost', True)
+
+        # 修复：使用更好的对话框样式
+        main_frame = tk.Frame(self.window, bg='#FF6347', bd=1)
+        main_frame.pack(padx=1, pady=1)
+
+        self.label = tk.Label(main_frame,
+                              bg='#FFE4E1',
+                              fg='#DC143C',
+                              font=('Microsoft YaHei UI', 8),
+                              padx=5,
+                              pady=3)
+        self.label.pack()
+
+
+class CloneWindow:
+    """分身窗口（窗口模式下每个分身一个）"""
+
+    def __init__(self, master, width, height):
+        self.window = tk.Toplevel(master)
+        self.window.withdraw()
+        self.window.overrideredirect(True)
+        self.window.wm_attributes('-topmost', True)
+        self.window.wm_attributes('-transparentcolor', 'white')
+        self.window.configure(bg='white')
+
+        # 修复：确保分身窗口完全不透明
+        try:
+            self.window.wm_attributes('-alpha', 1.0)
+        except:
+            pass
+
+        # 创建分身标签 - 修复：使用与主窗口一致的尺寸
+        self.label = tk.Label(self.window, bg='white', highlightthickness=0, bd=0)
+        self.label.pack()
+        self.window.geometry(f"{width}x{height}")
+
+
+class WindowPool:
+    """预先创建好的隐藏窗口，用完后隐藏放回而不是销毁
+
+    池里最多保留 max_size 个空闲窗口，多出的直接销毁；稳定运行时不再创建新控件
+    """
+
+    def __init__(self, factory, max_size=8):
+        self.factory = factory  # 创建一个新窗口对象，对象的 window 属性是 Toplevel
+        self.max_size = max_size
+        self.idle = []
+        self.created = 0
+
+    def prefill(self, count):
+        while len(self.idle) < min(count, self.max_size):
+            self.idle.append(self.factory())
+            self.created += 1
+
+    def acquire(self):
+        while self.idle:
+            item = self.idle.pop()
+            try:
+                if item.window.winfo_exists():
+                    return item
+            except tk.TclError:
+                pass  # 窗口已被销毁
+        self.created += 1
+        return self.factory()
+
+    def release(self, item, tweens=None):
+        """放回窗口池，tweens 不为空时同时取消该窗口上还在进行的补间"""
+        if tweens is not None:
+            tweens.cancel(item.window)
+        try:
+            if not item.window.winfo_exists():
+                return
+            if len(self.idle) < self.max_size:
+                item.window.withdraw()
+                self.idle.append(item)
+            else:
+                item.window.destroy()
+        except tk.TclError:
+            pass  # 窗口已被销毁
 
 
 class DesktopPet:
-    def __init__(self):
+    def __init__(self, compositor=False, motion_hz=20):
         # 创建主窗口
         self.root = tk.Tk()
-        self.setup_window()
+        # 所有定时任务共用一个调度器，主循环太忙时自动降低画质
+        self.frame_monitor = FrameTimeMonitor()
+        self.scheduler = TickScheduler(self.root, monitor=self.frame_monitor)
+        # 所有淡入淡出共用一个补间任务
+        self.tweens = TweenEngine(self.scheduler)
+        # 合成模式下主窗口是全屏透明画布，宠物和分身都画在上面
+        self.compositor = None
+        self.setup_window(compositor)
         # 新增：屏幕抖动相关变量
         self.last_shake_time = 0  # 上次屏幕抖动时间
         self.shake_cooldown = 60  # 屏幕抖动冷却时间（4分钟）
@@ -234,6 +2258,14 @@ class DesktopPet:
         # 初始化变量
         self.current_gif_index = 0
         self.animated_gifs = []
+        self.placeholder_gif = None  # 动画预处理完成前显示的默认动画
+        self.pet_cursor = PlaybackCursor()  # 主宠物的播放位置
+        self.frame_interval_ms = 50  # 动画最短刷新间隔，帧更密的动画会跳帧而不是放慢
+        self.pet_image = None  # 主宠物标签正在显示的画布
+        self.asset_preloaders = []  # 正在运行的图片预处理任务
+        self.asset_bundle = None
+        self.asset_watcher = None
+        self.image_dir = "tupian"
         self.is_dragging = False
         self.drag_start_x = 0
         self.drag_start_y = 0
@@ -255,9 +2287,21 @@ class DesktopPet:
         # 分身系统
         self.clones = []  # 存储所有分身
         self.clone_count = 0  # 当前分身数量
+        self.clone_serial = 0  # 分身编号，只增不减
+        self.max_clones = 300  # 分身数量上限
+        self.clone_swarm = CloneSwarm()  # 分身的位置和速度，批量移动
         self.last_clone_time = 0  # 上次创建分身的时间
         self.clone_cooldown = 60  # 分身冷却时间（1分钟）
 
+        # 对话气泡和分身窗口重复使用，每个窗口池最多保留 window_pool_size 个空闲窗口
+        self.window_pool_size = 8
+        self.bubble_pool = WindowPool(lambda: SpeechBubble(self.root), self.window_pool_size)
+        self.clone_bubble_pool = WindowPool(lambda: CloneBubble(self.root), self.window_pool_size)
+        self.clone_window_pool = WindowPool(lambda: CloneWindow(self.root, self.clone_swarm.width,
+                                                                self.clone_swarm.height),
+                                            self.window_pool_size)
+        self.bubble_pool.prefill(2)
+
         # 获取屏幕尺寸
         self.screen_width = self.root.winfo_screenwidth()
         self.screen_height = self.root.winfo_screenheight()
@@ -272,27 +2316,60 @@ class DesktopPet:
         # 初始位置
         self.x = random.randint(0, self.screen_width - self.pet_width)
         self.y = random.randint(0, self.screen_height - self.pet_height)
-
-        # 移动速度和方向
-        self.dx = random.choice([-2, -1, 1, 2])
-        self.dy = random.choice([-2, -1, 1, 2])
-
-        # 加载动画图片
+        self.placed_position = None  # 最近一次实际设置的窗口位置
+        self.motion_clock = MotionClock()
+        self.motion_hz = 20  # 移动刷新频率（10-60），只影响平滑程度，不影响移动速度
+        self.set_motion_rate(motion_hz)
+
+        # 系统状态由后台线程定时采集，并保存在内存中的多精度时间序列里
+        self.metrics_history = MetricsHistory()
+        # 样本同时保存到 ~/.desktop_pet/metrics.db，用于查看一周的走势
+        self.metrics_database = MetricsDatabase()
+        # 占用CPU、内存和读写最多的进程
+        self.process_tracker = ProcessTracker()
+        self.metrics = MetricsSampler(recorders=[self.metrics_history, self.metrics_database,
+                                                 self.process_tracker])
+
+        # 电源策略：使用电池、系统繁忙或用户不在时降低刷新频率、分身数量和对话频率
+        self.power_governor = PowerGovernor()
+
+        # 移动速度和方向（像素/秒），位置保留小数，显示时才取整
+        self.dx = random_speed()
+        self.dy = random_speed()
+
+        # 加载动画图片（处理结果缓存在 ~/.desktop_pet/cache/）
+        self.frame_cache = FrameCache()
+        self.frame_memory_mb = 64  # 已解码动画帧的内存预算
+        self.frame_budget = FrameBudget(self.frame_memory_mb)
+        self.pet_cursor.budget = self.frame_budget
         self.load_animated_images()
 
+        # 从图片文件夹加载时监视文件变化，修改图片后自动重新加载
+        if self.asset_bundle is None:
+            self.asset_watcher = AssetWatcher(self.image_dir)
+            self.asset_watcher.start()
+            self.scheduler.after(1000, self.poll_asset_changes, TickScheduler.PRIORITY_BACKGROUND,
+                                name='poll_asset_changes')
+
         # 创建标签显示图片
-        self.pet_label = tk.Label(self.root, bg='white', highlightthickness=0, bd=0)
-        self.pet_label.pack()
+        if self.compositor is not None:
+            self.pet_label = None
+            self.compositor.add('pet', self.x, self.y)
+            bind = lambda sequence, func: self.compositor.canvas.tag_bind('pet', sequence, func)
+        else:
+            self.pet_label = tk.Label(self.root, bg='white', highlightthickness=0, bd=0)
+            self.pet_label.pack()
+            bind = self.pet_label.bind
 
         # 绑定鼠标事件
-        self.pet_label.bind('<Button-1>', self.start_drag)
-        self.pet_label.bind('<B1-Motion>', self.drag)
-        self.pet_label.bind('<ButtonRelease-1>', self.stop_drag)
-        self.pet_label.bind('<Double-Button-1>', self.show_menu)
+        bind('<Button-1>', self.start_drag)
+        bind('<B1-Motion>', self.drag)
+        bind('<ButtonRelease-1>', self.stop_drag)
+        bind('<Double-Button-1>', self.show_menu)
 
         # 启动动画和移动
         self.animate_current_gif()
-        self.move_pet()
+        self.restart_movement()
         self.update_system_info()
 
         # 右键菜单
@@ -300,19 +2377,22 @@ class DesktopPet:
 
         # 10秒切换GIF的定时器
         self.schedule_gif_switch()
+        # 屏幕抖动检查
         self.schedule_screen_shake()
         # 15秒显示文字对话的定时器
         self.schedule_speech()
-        self.schedule_screen_shake()
         # 整点报时检查
         self.check_hourly_announcement()
-        self.schedule_screen_shake()
         # 捣蛋模式定时器
         self.schedule_mischief()
-        self.schedule_screen_shake()
         # 分身管理定时器
         self.schedule_clone_management()
-        self.schedule_screen_shake()
+        # 电源策略检查
+        self.scheduler.after(10000, self.update_power_policy, TickScheduler.PRIORITY_BACKGROUND,
+                             name='power_governor')
+        # 帧时间预算检查
+        self.scheduler.after(5000, self.check_frame_budget, TickScheduler.PRIORITY_BACKGROUND,
+                             name='frame_monitor')
 
     def schedule_screen_shake(self):
         """安排屏幕抖动（仅在捣蛋模式下）- 修复版"""
@@ -328,13 +2408,13 @@ class DesktopPet:
                 self.show_speech("哈哈！准备震动屏幕啦！😈", special=True)
 
                 # 2秒后开始抖动
-                self.root.after(2000, self.start_screen_shake)
+                self.scheduler.after(2000, self.start_screen_shake, name='start_screen_shake')
 
             # 每30秒检查一次是否该抖动
-            self.root.after(30000, check_shake)
+            self.scheduler.after(30000, check_shake, TickScheduler.PRIORITY_BACKGROUND, name='check_shake')
 
         # 首次检查延迟10秒
-        self.root.after(10000, check_shake)
+        self.scheduler.after(10000, check_shake, TickScheduler.PRIORITY_BACKGROUND, name='check_shake')
 
     def start_screen_shake(self):
         """开始屏幕抖动效果 - 修复版"""
@@ -503,13 +2583,20 @@ class DesktopPet:
     #         self.show_speech("震动失败了...😤")
     #         self.is_shaking = False
 
-    def setup_window(self):
+    def setup_window(self, compositor=False):
         """设置窗口属性"""
         self.root.overrideredirect(True)  # 无边框
         self.root.wm_attributes('-topmost', True)  # 置顶
         self.root.wm_attributes('-transparentcolor', 'white')  # 透明背景
         self.root.configure(bg='white')
 
+        if compositor:
+            # 铺满整个屏幕，透明部分的鼠标点击会穿透到下面的窗口
+            width = self.root.winfo_screenwidth()
+            height = self.root.winfo_screenheight()
+            self.root.geometry(f"{width}x{height}+0+0")
+            self.compositor = SceneCompositor(self.root, width, height)
+
         # 优化窗口透明度设置，减少在浅色背景下的模糊
         try:
             self.root.wm_attributes('-alpha', 1.0)  # 完全不透明，避免alpha混合造成的模糊
@@ -518,7 +2605,10 @@ class DesktopPet:
 
     def load_animated_images(self):
         """加载动画图片"""
-        image_dir = "tupian"
+        if os.path.exists(BUNDLE_PATH) and self.load_asset_bundle(BUNDLE_PATH):
+            return
+
+        image_dir = self.image_dir
         if not os.path.exists(image_dir):
             os.makedirs(image_dir)
             messagebox.showinfo("提示", f"请将动图文件放入 {image_dir} 文件夹中")
@@ -526,65 +2616,234 @@ class DesktopPet:
             return
 
         # 获取图片文件
-        image_files = [f for f in os.listdir(image_dir) if f.lower().endswith(('.png', '.gif', '.jpg', '.jpeg'))]
+        image_files = [f for f in os.listdir(image_dir) if f.lower().endswith(IMAGE_EXTENSIONS)]
 
         if not image_files:
             messagebox.showwarning("警告", f"{image_dir} 文件夹中没有找到图片文件")
             self.create_default_gif()
             return
 
-        # 加载所有图片为动画对象
+        # 清理已删除图片的缓存
+        self.frame_cache.prune(os.path.join(image_dir, f) for f in image_files)
+
+        # 只登记图片路径，帧在动画第一次播放时才解码
         for img_file in sorted(image_files):  # 排序确保顺序一致
+            img_path = os.path.join(image_dir, img_file)
+            self.animated_gifs.append(AnimatedGif(img_path, self.frame_cache, self.frame_budget))
+        print(f"登记了 {len(self.animated_gifs)} 个动画")
+
+        # 预处理在进程池中进行，完成前先显示默认动画
+        self.start_asset_preloader(self.animated_gifs)
+
+    def start_asset_preloader(self, gifs):
+        """在后台预处理一批动画，结果由 poll_preloaded_assets 接收"""
+        if self.placeholder_gif is None:
+            self.placeholder_gif = self.build_default_gif()
+        preloader = AssetPreloader(gifs, self.frame_cache)
+        preloader.start()
+        self.asset_preloaders.append(preloader)
+        self.scheduler.after(50, self.poll_preloaded_assets, name='poll_preloaded_assets')
+
+    def load_asset_bundle(self, bundle_path):
+        """从预编译资源包加载动画，失败时返回 False 改用图片文件夹"""
+        try:
+            bundle = AssetBundle(bundle_path)
+        except Exception as e:
+            print(f"读取资源包失败 {bundle_path}: {e}")
+            return False
+
+        if not bundle.entries:
+            return False
+
+        self.asset_bundle = bundle
+        for entry in bundle.entries:
+            self.animated_gifs.append(BundledAnimation(bundle, entry, self.frame_budget))
+        print(f"从资源包登记了 {len(self.animated_gifs)} 个动画")
+
+        self.activate_animation(self.current_gif_index)
+        return True
+
+    def poll_preloaded_assets(self):
+        """在主线程中接收进程池的处理结果，把完成的动画换上"""
+        next_gif = self.animated_gifs[(self.current_gif_index + 1) % len(self.animated_gifs)]
+        pinned = self.pinned_animations()
+
+        for preloader in self.asset_preloaders[:]:
             try:
-                img_path = os.path.join(image_dir, img_file)
-                animated_gif = AnimatedGif(img_path)
-                self.animated_gifs.append(animated_gif)
-                print(f"成功加载: {img_file} (帧数: {len(animated_gif.frames)})")
-            except Exception as e:
-                print(f"加载图片 {img_file} 失败: {e}")
+                while True:
+                    gif, images, delays, error = preloader.results.get_nowait()
+                    # 只保留马上要显示的动画的帧，其余已写入磁盘缓存，用到时再读取
+                    keep = gif in pinned or gif is next_gif
+                    gif.receive_preloaded(images if keep else None, delays, error)
+                    if gif in pinned:
+                        self.activate_animation(self.animated_gifs.index(gif))
+            except queue.Empty:
+                pass
+
+            if preloader.finished and preloader.results.empty():
+                self.asset_preloaders.remove(preloader)
 
+        if self.asset_preloaders:
+            self.scheduler.after(50, self.poll_preloaded_assets, name='poll_preloaded_assets')
+
+    def poll_asset_changes(self):
+        """接收文件监视器报告的变化，稍作合并后重新加载"""
+        changed = set()
+        try:
+            while True:
+                changed.add(self.asset_watcher.changes.get_nowait())
+        except queue.Empty:
+            pass
+
+        if changed:
+            self.reload_assets(changed)
+
+        self.scheduler.after(1000, self.poll_asset_changes, TickScheduler.PRIORITY_BACKGROUND,
+                                name='poll_asset_changes')
+
+    def reload_assets(self, names):
+        """只重新处理变化的图片，并保持当前动画和分身的动画不变"""
+        old_gifs = self.animated_gifs
+        current_gif = old_gifs[self.current_gif_index]
+        clone_gifs = [(clone, old_gifs[clone['gif_index']]) for clone in self.clones]
+
+        by_name = {os.path.basename(gif.path): gif for gif in old_gifs
+                   if not isinstance(gif, GeneratedAnimation)}
+        replaced = {}  # 旧动画 -> 新动画
+        fresh = []
+
+        for name in names:
+            path = os.path.join(self.image_dir, name)
+            old = by_name.pop(name, None)
+            if old is not None:
+                self.frame_budget.forget(old)
+            if os.path.exists(path):
+                gif = AnimatedGif(path, self.frame_cache, self.frame_budget)
+                by_name[name] = gif
+                fresh.append(gif)
+                if old is not None:
+                    replaced[old] = gif
+                print(f"{'重新加载' if old is not None else '新增'}图片: {name}")
+            elif old is not None:
+                print(f"移除图片: {name}")
+
+        if by_name:
+            self.animated_gifs = [by_name[name] for name in sorted(by_name)]
+        else:
+            self.animated_gifs = [self.placeholder_gif or self.build_default_gif()]
+        self.frame_cache.prune(gif.path for gif in self.animated_gifs)
+
+        def new_index(gif, old_index):
+            gif = replaced.get(gif, gif)
+            if gif in self.animated_gifs:
+                return self.animated_gifs.index(gif)
+            # 动画已被删除，换成原位置附近的动画
+            return min(old_index, len(self.animated_gifs) - 1)
+
+        self.current_gif_index = new_index(current_gif, self.current_gif_index)
+        for clone, gif in clone_gifs:
+            clone['gif_index'] = new_index(gif, clone['gif_index'])
+        self.wake_animations()
+
+        if fresh:
+            self.start_asset_preloader(fresh)
+
+    def activate_animation(self, index):
+        """开始使用某个动画：确保帧已加载，并在超出内存预算时释放空闲动画"""
+        gif = self.animated_gifs[index]
+        self.wake_animations()
+        if gif.pending:
+            # 预处理完成后由 poll_preloaded_assets 加载
+            return gif
+        if gif.loaded:
+            self.frame_budget.record_hit(gif)
+        else:
+            gif.ensure_loaded()
+        self.frame_budget.enforce(self.pinned_animations())
+        return gif
+
+    def wake_animations(self):
+        """显示的动画可能变了，让停下的动画（静态图片）重新画一次
+
+        还在播放的动画已有同名定时任务，这里不会重复启动
+        """
+        self.scheduler.after(0, self.animate_current_gif, TickScheduler.PRIORITY_RENDER, name='animate_pet')
+        for clone_obj in self.clones:
+            self.scheduler.after(0, lambda c=clone_obj: self.animate_clone(c), TickScheduler.PRIORITY_RENDER,
+                                 name=f"animate_clone:{clone_obj['id']}")
+
+    def pinned_animations(self):
+        """当前正在显示的动画（主宠物和所有分身）"""
+        pinned = {self.animated_gifs[self.current_gif_index]}
+        pinned.update(self.animated_gifs[clone['gif_index']] for clone in self.clones)
+        return pinned
+
+    def prefetch_animation(self, index):
+        """在后台线程中预先解码指定动画，避免切换时卡顿"""
         if not self.animated_gifs:
-            self.create_default_gif()
+            return
+        gif = self.animated_gifs[index % len(self.animated_gifs)]
+        if not gif.loaded and not gif.pending:
+            threading.Thread(target=gif.prefetch, daemon=True).start()
 
     def create_default_gif(self):
         """创建默认动画"""
+        default_gif = self.build_default_gif()
+        if default_gif is not None:
+            self.animated_gifs.append(default_gif)
+
+    def build_default_gif(self):
+        """生成默认动画对象，失败时返回 None"""
         # 创建一个简单的默认动画
-        frames = []
         colors = [(255, 182, 193, 255), (255, 192, 203, 255), (255, 160, 180, 255)]
 
         try:
-            for color in colors:
-                img = Image.new('RGBA', (100, 100), color)
-                frames.append(ImageTk.PhotoImage(img))
+            images = [Image.new('RGBA', (100, 100), color) for color in colors]
 
             # 创建默认动画对象
-            default_gif = type('DefaultGif', (), {
-                'frames': frames,
-                'delays': [500] * len(frames),
-                'current_frame': 0,
-                'get_current_frame': lambda self: self.frames[self.current_frame],
-                'get_current_delay': lambda self: self.delays[self.current_frame],
-                'next_frame': lambda self: setattr(self, 'current_frame', (self.current_frame + 1) % len(self.frames))
-            })()
+            default_gif = GeneratedAnimation("默认动画", images, [500] * len(images))
+            default_gif.ensure_loaded()
 
-            self.animated_gifs.append(default_gif)
+            return default_gif
         except Exception as e:
             print(f"创建默认动画失败: {e}")
+            return None
+
+    def displayed_animation(self, index):
+        """取出要显示的动画，还在后台预处理时用默认动画代替"""
+        gif = self.animated_gifs[index]
+        if gif.pending and self.placeholder_gif is not None:
+            return self.placeholder_gif
+        gif.ensure_loaded()
+        return gif
 
     def animate_current_gif(self):
         """播放当前GIF动画"""
         if self.animated_gifs:
-            current_gif = self.animated_gifs[self.current_gif_index]
-
-            # 显示当前帧
-            self.pet_label.configure(image=current_gif.get_current_frame())
+            cursor = self.pet_cursor
+            cursor.show(self.displayed_animation(self.current_gif_index))
+
+            # 按时钟前进到现在应该显示的帧，刷新晚了就跳帧
+            now = time.monotonic()
+            cursor.advance(now)
+
+            # 显示当前帧，画布不变时只需更新画布内容
+            image = cursor.render()
+            if image is not self.pet_image:
+                if self.compositor is not None:
+                    self.compositor.set_image('pet', image)
+                else:
+                    self.pet_label.configure(image=image)
+                self.pet_image = image
 
-            # 切换到下一帧
-            current_gif.next_frame()
+            # 静态图片不需要定时刷新，换动画时由 wake_animations 重新启动
+            if cursor.is_static():
+                return
 
-            # 根据帧延迟时间安排下次更新
-            delay = max(50, current_gif.get_current_delay())  # 最小50ms延迟
-            self.root.after(delay, self.animate_current_gif)
+            # 在当前帧结束时安排下次更新，刷新间隔不小于 frame_interval_ms
+            delay = cursor.wait_ms(now, self.frame_interval())
+            self.scheduler.after(delay, self.animate_current_gif, TickScheduler.PRIORITY_RENDER,
+                                 name='animate_pet')
 
     def schedule_gif_switch(self):
         """安排10秒后切换到下一个GIF"""
@@ -593,14 +2852,25 @@ class DesktopPet:
             if len(self.animated_gifs) > 1:
                 self.current_gif_index = (self.current_gif_index + 1) % len(self.animated_gifs)
                 print(f"切换到第 {self.current_gif_index + 1} 个GIF")
+                self.activate_animation(self.current_gif_index)
+                # 预取再下一个动画，下次切换时无需等待解码
+                self.prefetch_animation(self.current_gif_index + 1)
             # 继续安排下次切换
             self.schedule_gif_switch()
 
-        self.root.after(10000, switch_gif)  # 10秒后切换
+        self.scheduler.after(10000, switch_gif, name='gif_switch')  # 10秒后切换
 
     def quit_app(self):
         """退出应用"""
         self.destroy_all_clones()  # 销毁所有分身
+        for preloader in self.asset_preloaders:
+            preloader.stop()
+        if self.asset_watcher is not None:
+            self.asset_watcher.stop()
+        self.metrics.stop()
+        self.metrics_database.stop()
+        self.tweens.stop()
+        self.scheduler.stop()
         self.root.destroy()  # 销毁主窗口
         print("桌面宠物已退出")
     def create_menu(self):
@@ -652,9 +2922,9 @@ class DesktopPet:
         # 停止屏幕抖动（如果正在进行）
         self.is_shaking = False
         # 重新开始正常移动
-        self.dx = random.choice([-2, -1, 1, 2])
-        self.dy = random.choice([-2, -1, 1, 2])
-        self.move_pet()
+        self.dx = random_speed()
+        self.dy = random_speed()
+        self.restart_movement()
         # 清除所有分身
         self.show_speech("切换到乖巧模式啦～我会很听话的！", special=True)
 
@@ -672,11 +2942,12 @@ class DesktopPet:
         if self.mode == "good":
             # 乖巧模式的对话
             try:
-                cpu_percent = psutil.cpu_percent(interval=0.1)
-                memory = psutil.virtual_memory()
-                memory_percent = memory.percent
+                # 读取后台采集的快照，不在主线程中调用 psutil
+                metrics = self.metrics.snapshot
+                cpu_percent = metrics.cpu_percent
+                memory_percent = metrics.memory_percent
 
-                return [
+                messages = [
                     f"理理我嘛～CPU使用率{cpu_percent:.1f}%",
                     f"内存使用率{memory_percent:.1f}%，还好嘛～",
                     "需要我清理缓存垃圾吗？",
@@ -690,6 +2961,17 @@ class DesktopPet:
                     "记得要好好休息哦！",
                     "宝宝，我爱你哦"
                 ]
+
+                # 最近一小时的平均CPU和今天的内存峰值
+                hour_cpu = self.metrics_history.average('cpu', 3600)
+                if hour_cpu is not None:
+                    messages.append(f"最近一小时CPU平均{hour_cpu:.1f}%～")
+                today = datetime.datetime.now()
+                seconds_today = today.hour * 3600 + today.minute * 60 + today.second
+                memory_peak = self.metrics_history.peak('memory', seconds_today)
+                if memory_peak is not None:
+                    messages.append(f"今天内存最高用到了{memory_peak:.1f}%哦")
+                return messages
             except:
                 return [
                     "我在这里陪着你呢～",
@@ -736,9 +3018,9 @@ class DesktopPet:
             # 继续安排下次对话
             self.schedule_speech()
 
-        # 随机15-25秒显示一次对话
-        delay = random.randint(15000, 25000)
-        self.root.after(delay, show_random_speech)
+        # 随机15-25秒显示一次对话，省电时间隔更长
+        delay = int(random.randint(15000, 25000) * self.power_governor.policy.speech_scale)
+        self.scheduler.after(delay, show_random_speech, TickScheduler.PRIORITY_BACKGROUND, name='speech')
 
     def schedule_mischief(self):
         """安排捣蛋行为（仅在捣蛋模式下）"""
@@ -753,13 +3035,13 @@ class DesktopPet:
                 self.show_speech("嘿嘿～我要开始搞破坏啦！😈", special=True)
 
                 # 2秒后执行捣蛋行为
-                self.root.after(2000, self.perform_desktop_mischief)
+                self.scheduler.after(2000, self.perform_desktop_mischief, name='perform_mischief')
 
             # 每30秒检查一次是否该捣蛋
-            self.root.after(30000, do_mischief)
+            self.scheduler.after(30000, do_mischief, TickScheduler.PRIORITY_BACKGROUND, name='mischief')
 
         # 首次检查延迟10秒
-        self.root.after(10000, do_mischief)
+        self.scheduler.after(10000, do_mischief, TickScheduler.PRIORITY_BACKGROUND, name='mischief')
 
     def get_desktop_icons(self):
         """获取桌面图标位置 - 改进版"""
@@ -1018,9 +3300,9 @@ class DesktopPet:
             current_time = time.time()
 
             if self.mode == "naughty":
-                # 捣蛋模式：每1分钟创建一个分身，最多30个
+                # 捣蛋模式：每1分钟创建一个分身，最多 max_clones 个（省电时更少）
                 if (current_time - self.last_clone_time > self.clone_cooldown and
-                        self.clone_count < 30):
+                        self.clone_count < self.clone_limit()):
                     self.create_clone()
                     self.last_clone_time = current_time
             else:
@@ -1029,72 +3311,67 @@ class DesktopPet:
                     self.destroy_all_clones()
 
             # 每10秒检查一次
-            self.root.after(10000, manage_clones)
+            self.scheduler.after(10000, manage_clones, TickScheduler.PRIORITY_BACKGROUND, name='clone_management')
 
         # 首次检查延迟5秒
-        self.root.after(5000, manage_clones)
+        self.scheduler.after(5000, manage_clones, TickScheduler.PRIORITY_BACKGROUND, name='clone_management')
 
     def create_clone(self):
         """创建一个分身 - 修复版本"""
         try:
             self.clone_count += 1
-            clone_id = f"clone_{self.clone_count}"
-
-            # 创建分身窗口
-            clone_window = tk.Toplevel(self.root)
-            clone_window.overrideredirect(True)
-            clone_window.wm_attributes('-topmost', True)
-            clone_window.wm_attributes('-transparentcolor', 'white')
-            clone_window.configure(bg='white')
-
-            # 修复：确保分身窗口完全不透明
-            try:
-                clone_window.wm_attributes('-alpha', 1.0)
-            except:
-                pass
-
-            # 创建分身标签 - 修复：使用与主窗口一致的尺寸
-            clone_label = tk.Label(clone_window, bg='white', highlightthickness=0, bd=0)
-            clone_label.pack()
+            self.clone_serial += 1
+            clone_id = f"clone_{self.clone_serial}"  # 分身计数会被重置，编号不会，保证定时任务名称唯一
 
             # 修复：使用与主窗口一致的宠物尺寸（150x150）
-            clone_pet_width = 150
-            clone_pet_height = 150
+            clone_pet_width = self.clone_swarm.width
+            clone_pet_height = self.clone_swarm.height
 
             # 随机位置 - 修复：确保完全在屏幕内
             clone_x = random.randint(50, max(100, self.screen_width - clone_pet_width - 50))
             clone_y = random.randint(50, max(100, self.screen_height - clone_pet_height - 50))
 
-            # 修复：正确设置窗口几何
-            clone_window.geometry(f"{clone_pet_width}x{clone_pet_height}+{clone_x}+{clone_y}")
+            if self.compositor is not None:
+                # 合成模式：分身只是画布上的一个图像项，不创建窗口
+                clone_window = None
+                clone_label = None
+                self.compositor.add(clone_id, clone_x, clone_y)
+            else:
+                # 从窗口池取出分身窗口
+                pooled = self.clone_window_pool.acquire()
+                clone_window = pooled.window
+                clone_label = pooled.label
+
+                # 修复：正确设置窗口几何
+                clone_window.geometry(f"{clone_pet_width}x{clone_pet_height}+{clone_x}+{clone_y}")
+                clone_window.deiconify()
 
-            # 强制更新窗口
-            clone_window.update_idletasks()
+                # 强制更新窗口
+                clone_window.update_idletasks()
 
             # 随机移动方向
-            clone_dx = random.choice([-2, -1, 1, 2])
-            clone_dy = random.choice([-2, -1, 1, 2])
+            clone_dx = random_speed()
+            clone_dy = random_speed()
 
-            # 创建分身对象
+            # 创建分身对象，位置和速度保存在 clone_swarm 中
             clone_obj = {
                 'id': clone_id,
                 'window': clone_window,
                 'label': clone_label,
-                'x': clone_x,
-                'y': clone_y,
-                'dx': clone_dx,
-                'dy': clone_dy,
+                'pooled': None if self.compositor is not None else pooled,
                 'gif_index': random.randint(0, len(self.animated_gifs) - 1),
-                'last_speech_time': 0,
-                'pet_width': clone_pet_width,  # 添加尺寸信息
-                'pet_height': clone_pet_height
+                'cursor': PlaybackCursor(budget=self.frame_budget)
             }
 
             self.clones.append(clone_obj)
+            self.clone_swarm.add(clone_obj, clone_x, clone_y, clone_dx, clone_dy)
+            self.activate_animation(clone_obj['gif_index'])
 
             # 延迟开始动画，确保窗口完全创建
-            self.root.after(100, lambda: self.animate_clone(clone_obj))
-            self.root.after(150, lambda: self.move_clone(clone_obj))
+            self.scheduler.after(100, lambda: self.animate_clone(clone_obj), TickScheduler.PRIORITY_RENDER,
+                                 name=f"animate_clone:{clone_id}")
+            # 所有分身共用一个移动任务，已在运行时不会重复启动
+            self.scheduler.after(150, self.move_clones, TickScheduler.PRIORITY_MOTION, name='move_clones')
 
             self.show_speech(f"哈哈！我有 {self.clone_count} 个分身啦！😈", special=True)
 
@@ -1104,80 +3381,80 @@ class DesktopPet:
     def animate_clone(self, clone_obj):
         """分身动画 - 修复版本"""
         try:
-            if (clone_obj['window'] and
-                    clone_obj['window'].winfo_exists() and
-                    clone_obj in self.clones):  # 确保分身仍在列表中
+            if self.clone_alive(clone_obj):
 
-                current_gif = self.animated_gifs[clone_obj['gif_index']]
+                # 每个分身有自己的播放位置，不会影响主宠物和其他分身
+                cursor = clone_obj['cursor']
+                cursor.show(self.displayed_animation(clone_obj['gif_index']))
+                now = time.monotonic()
+                cursor.advance(now)
 
                 # 修复：确保图片正确显示
                 try:
-                    current_frame = current_gif.get_current_frame()
-                    if current_frame:
+                    current_frame = cursor.render()
+                    if self.compositor is not None:
+                        self.compositor.set_image(clone_obj['id'], current_frame)
+                    elif current_frame is not getattr(clone_obj['label'], 'image', None):
                         clone_obj['label'].configure(image=current_frame)
                         clone_obj['label'].image = current_frame  # 防止垃圾回收
 
-                    current_gif.next_frame()
+                    if cursor.is_static():
+                        return
 
                     # 继续动画
-                    delay = max(50, current_gif.get_current_delay())
-                    self.root.after(delay, lambda: self.animate_clone(clone_obj))
+                    delay = cursor.wait_ms(now, self.frame_interval())
+                    self.scheduler.after(delay, lambda: self.animate_clone(clone_obj), TickScheduler.PRIORITY_RENDER,
+                                         name=f"animate_clone:{clone_obj['id']}")
                 except Exception as img_error:
                     print(f"分身图片显示错误: {img_error}")
                     # 如果图片显示失败，尝试重新设置
-                    self.root.after(1000, lambda: self.animate_clone(clone_obj))
+                    self.scheduler.after(1000, lambda: self.animate_clone(clone_obj), TickScheduler.PRIORITY_RENDER,
+                                         name=f"animate_clone:{clone_obj['id']}")
 
         except Exception as e:
             print(f"分身动画失败: {e}")
 
-    def move_clone(self, clone_obj):
-        """移动分身 - 修复版本"""
-        try:
-            if not (clone_obj['window'] and
-                    clone_obj['window'].winfo_exists() and
-                    clone_obj in self.clones):
-                return
-
-            # 更新位置
-            clone_obj['x'] += clone_obj['dx']
-            clone_obj['y'] += clone_obj['dy']
-
-            # 边界检测 - 使用分身自己的尺寸
-            pet_width = clone_obj.get('pet_width', self.pet_width)
-            pet_height = clone_obj.get('pet_height', self.pet_height)
-
-            if clone_obj['x'] <= 0 or clone_obj['x'] >= self.screen_width - pet_width:
-                clone_obj['dx'] = -clone_obj['dx']
-            if clone_obj['y'] <= 0 or clone_obj['y'] >= self.screen_height - pet_height:
-                clone_obj['dy'] = -clone_obj['dy']
-
-            # 限制在屏幕内
-            clone_obj['x'] = max(0, min(clone_obj['x'], self.screen_width - pet_width))
-            clone_obj['y'] = max(0, min(clone_obj['y'], self.screen_height - pet_height))
+    def move_clones(self):
+        """批量移动所有分身，整个分身群只有一个定时任务"""
+        swarm = self.clone_swarm
+        if not len(swarm):
+            return
 
-            # 修复：更新窗口位置
-            try:
-                clone_obj['window'].geometry(f"+{int(clone_obj['x'])}+{int(clone_obj['y'])}")
-            except tk.TclError:
-                # 窗口可能已被销毁
-                return
+        try:
+            # 只有整数坐标变化的分身才需要移动窗口（合成模式下移动画布项）
+            for i in swarm.step(self.screen_width, self.screen_height):
+                try:
+                    if self.compositor is not None:
+                        self.compositor.move(swarm.members[i]['id'], swarm.x[i], swarm.y[i])
+                    else:
+                        swarm.members[i]['window'].geometry(f"+{int(swarm.x[i])}+{int(swarm.y[i])}")
+                except tk.TclError:
+                    pass  # 窗口可能已被销毁
 
             # 分身偶尔说话
-            current_time = time.time()
-            if current_time - clone_obj['last_speech_time'] > random.randint(30, 60):
-                clone_obj['last_speech_time'] = current_time
-                self.show_clone_speech(clone_obj)
-
-            # 继续移动
-            self.root.after(50, lambda: self.move_clone(clone_obj))
+            for i in swarm.due_speakers(time.time()):
+                self.show_clone_speech(swarm.members[i])
 
         except Exception as e:
             print(f"移动分身失败: {e}")
 
+        # 继续移动
+        self.scheduler.after(self.motion_interval_ms(), self.move_clones, TickScheduler.PRIORITY_MOTION,
+                             name='move_clones')
+
+    def clone_alive(self, clone_obj):
+        """分身是否仍然存在（合成模式下没有分身窗口）"""
+        if clone_obj not in self.clones:  # 确保分身仍在列表中
+            return False
+        if self.compositor is not None:
+            return True
+        return bool(clone_obj['window'] and clone_obj['window'].winfo_exists())
+
     def show_clone_speech(self, clone_obj):
         """显示分身对话 - 修复版本"""
+        bubble = None
         try:
-            if not (clone_obj['window'] and clone_obj['window'].winfo_exists()):
+            if not self.clone_alive(clone_obj):
                 return
 
             clone_messages = [
@@ -1190,32 +3467,19 @@ class DesktopPet:
             ]
             message = random.choice(clone_messages)
 
-            # 创建分身对话窗口
-            speech_window = tk.Toplevel(clone_obj['window'])
-            speech_window.overrideredirect(True)
-            speech_window.wm_attributes('-topmost', True)
-
-            # 修复：使用更好的对话框样式
-            main_frame = tk.Frame(speech_window, bg='#FF6347', bd=1)
-            main_frame.pack(padx=1, pady=1)
-
-            label = tk.Label(main_frame,
-                             text=message,
-                             bg='#FFE4E1',
-                             fg='#DC143C',
-                             font=('Microsoft YaHei UI', 8),
-                             padx=5,
-                             pady=3)
-            label.pack()
+            # 从窗口池取出分身对话框
+            bubble = self.clone_bubble_pool.acquire()
+            bubble.label.configure(text=message)
+            speech_window = bubble.window
 
             # 修复：位置计算使用分身实际尺寸
-            pet_width = clone_obj.get('pet_width', self.pet_width)
-            speech_x = clone_obj['x'] + pet_width + 10
-            speech_y = clone_obj['y']
+            clone_x, clone_y = self.clone_swarm.position(clone_obj)
+            speech_x = clone_x + self.clone_swarm.width + 10
+            speech_y = clone_y
 
             # 确保在屏幕内
             if speech_x + 80 > self.screen_width:
-                speech_x = clone_obj['x'] - 80
+                speech_x = clone_x - 80
             if speech_y + 30 > self.screen_height:
                 speech_y = self.screen_height - 30
 
@@ -1224,20 +3488,38 @@ class DesktopPet:
             speech_y = max(0, speech_y)
 
             speech_window.geometry(f"+{speech_x}+{speech_y}")
+            speech_window.deiconify()
 
-            # 2秒后消失
-            speech_window.after(2000, lambda: self.safe_destroy_window(speech_window))
+            # 2秒后隐藏，放回窗口池
+            self.scheduler.after(2000, lambda: self.clone_bubble_pool.release(bubble, self.tweens))
 
         except Exception as e:
             print(f"显示分身对话失败: {e}")
+            if bubble is not None:
+                self.clone_bubble_pool.release(bubble, self.tweens)
 
-    def safe_destroy_window(self, window):
-        """安全销毁窗口"""
+    def release_clone(self, clone_obj):
+        """停止分身的动画，并把它的窗口放回窗口池（合成模式下删除画布项）"""
+        self.scheduler.cancel_name(f"animate_clone:{clone_obj['id']}")
+        clone_obj['cursor'].release()
         try:
-            if window and window.winfo_exists():
-                window.destroy()
-        except:
-            pass
+            if self.compositor is not None:
+                self.compositor.remove(clone_obj['id'])
+            else:
+                # 隐藏分身窗口并放回窗口池
+                clone_obj['label'].configure(image='')
+                clone_obj['label'].image = None
+                self.clone_window_pool.release(clone_obj['pooled'], self.tweens)
+        except Exception as e:
+            print(f"销毁单个分身失败: {e}")
+
+    def trim_clones(self, limit):
+        """分身超过上限时收回最新创建的分身"""
+        while len(self.clones) > limit:
+            clone_obj = self.clones.pop()
+            self.release_clone(clone_obj)
+            self.clone_swarm.remove(clone_obj)
+        self.clone_count = len(self.clones)
 
     def destroy_all_clones(self):
         """销毁所有分身 - 修复版本"""
@@ -1246,14 +3528,12 @@ class DesktopPet:
 
             # 逐个销毁分身窗口
             for clone_obj in self.clones[:]:  # 使用副本避免迭代时修改列表
-                try:
-                    if clone_obj['window'] and clone_obj['window'].winfo_exists():
-                        clone_obj['window'].destroy()
-                except Exception as e:
-                    print(f"销毁单个分身失败: {e}")
+                self.release_clone(clone_obj)
 
             # 清空列表
             self.clones.clear()
+            self.clone_swarm.clear()
+            self.scheduler.cancel_name('move_clones')
             self.clone_count = 0
 
             if clone_count > 0:
@@ -1308,7 +3588,7 @@ class DesktopPet:
                 self.show_speech(announcement, duration=6000, special=True)
 
             # 每分钟检查一次
-            self.root.after(60000, check_time)
+            self.scheduler.after(60000, check_time, TickScheduler.PRIORITY_BACKGROUND, name='hourly_check')
 
         # 立即开始检查
         check_time()
@@ -1348,6 +3628,8 @@ class DesktopPet:
         """手动切换到下一个动画"""
         if len(self.animated_gifs) > 1:
             self.current_gif_index = (self.current_gif_index + 1) % len(self.animated_gifs)
+            self.activate_animation(self.current_gif_index)
+            self.prefetch_animation(self.current_gif_index + 1)
             if self.mode == "good":
                 self.show_speech(f"切换到第 {self.current_gif_index + 1} 个动画～")
             else:
@@ -1365,15 +3647,23 @@ class DesktopPet:
         self.is_dragging = True
         self.drag_start_x = event.x
         self.drag_start_y = event.y
+        if self.compositor is not None:
+            # 画布坐标就是屏幕坐标，记录鼠标相对宠物的偏移
+            self.drag_start_x -= int(self.x)
+            self.drag_start_y -= int(self.y)
 
     def drag(self, event):
         """拖拽中"""
         if self.is_dragging:
-            x = self.root.winfo_x() + event.x - self.drag_start_x
-            y = self.root.winfo_y() + event.y - self.drag_start_y
-            self.root.geometry(f"+{x}+{y}")
+            if self.compositor is not None:
+                x = event.x - self.drag_start_x
+                y = event.y - self.drag_start_y
+            else:
+                x = self.root.winfo_x() + event.x - self.drag_start_x
+                y = self.root.winfo_y() + event.y - self.drag_start_y
             self.x = x
             self.y = y
+            self.place_pet()
 
     def stop_drag(self, event):
         """停止拖拽"""
@@ -1399,6 +3689,9 @@ class DesktopPet:
                 else:
                     self.show_speech("放开我！我要自由！😤")
 
+            # 随机显示状态下没有移动循环，这里统一重新开始
+            self.restart_movement()
+
     def check_border_position(self):
         """检查是否在边框位置"""
         threshold = self.border_threshold
@@ -1431,12 +3724,71 @@ class DesktopPet:
         }
         return border_names.get(self.border_type, '边框')
 
+    def place_pet(self):
+        """把宠物显示在 (x, y)：移动主窗口，合成模式下移动画布项
+
+        只有整数坐标变化时才通知 Tk
+        """
+        position = (int(self.x), int(self.y))
+        if position == self.placed_position:
+            return
+        self.placed_position = position
+        if self.compositor is not None:
+            self.compositor.move('pet', *position)
+        else:
+            self.root.geometry(f"+{position[0]}+{position[1]}")
+
+    def restart_movement(self):
+        """立即重新开始移动循环，已在运行的循环会被替换而不是叠加"""
+        self.scheduler.cancel_name('random_movement')
+        self.motion_clock.reset()
+        self.scheduler.after(0, self.move_pet, TickScheduler.PRIORITY_MOTION, name='move_pet', replace=True)
+
+    def motion_interval_ms(self):
+        """移动刷新间隔，省电策略会降低频率"""
+        hz = self.motion_hz * self.power_governor.policy.motion_scale
+        return int(round(1000 / max(10, min(60, hz))))
+
+    def frame_interval(self):
+        """动画最短刷新间隔，省电策略和降低画质会加大间隔（跳更多帧）"""
+        return self.frame_interval_ms * self.power_governor.policy.frame_scale * self.frame_monitor.frame_scale
+
+    def clone_limit(self):
+        limits = [self.max_clones, self.power_governor.policy.clone_limit, self.frame_monitor.clone_limit]
+        return min(limit for limit in limits if limit is not None)
+
+    def check_frame_budget(self):
+        """每5秒检查主循环的延迟和耗时，超出预算降低画质，有余量后恢复"""
+        try:
+            if self.frame_monitor.evaluate() is not None:
+                self.trim_clones(self.clone_limit())
+        except Exception as e:
+            print(f"检查帧时间失败: {e}")
+        self.scheduler.after(5000, self.check_frame_budget, TickScheduler.PRIORITY_BACKGROUND,
+                             name='frame_monitor')
+
+    def update_power_policy(self):
+        """每10秒重新判断电源策略"""
+        try:
+            # 还没有采样结果时保持当前策略
+            if self.metrics.ready and self.power_governor.update(self.metrics.snapshot) is not None:
+                self.trim_clones(self.clone_limit())
+        except Exception as e:
+            print(f"更新电源策略失败: {e}")
+        self.scheduler.after(10000, self.update_power_policy, TickScheduler.PRIORITY_BACKGROUND,
+                             name='power_governor')
+
+    def set_motion_rate(self, hz):
+        """修改移动刷新频率，下一次移动起生效"""
+        self.motion_hz = max(10, min(60, hz))
+
     def move_pet(self):
         """移动宠物"""
+        dt = self.motion_clock.elapsed()
         if self.state == "moving":
             # 正常移动模式
-            self.x += self.dx
-            self.y += self.dy
+            self.x += self.dx * dt
+            self.y += self.dy * dt
 
             # 边界检测
             if self.x <= 0 or self.x >= self.screen_width - self.pet_width:
@@ -1448,11 +3800,11 @@ class DesktopPet:
             self.x = max(0, min(self.x, self.screen_width - self.pet_width))
             self.y = max(0, min(self.y, self.screen_height - self.pet_height))
 
-            self.root.geometry(f"+{int(self.x)}+{int(self.y)}")
+            self.place_pet()
 
         elif self.state == "border_moving":
             # 沿边框移动模式
-            self.move_along_border()
+            self.move_along_border(dt)
 
         elif self.state == "manual":
             # 手动位置30秒后开始随机显示
@@ -1473,13 +3825,14 @@ class DesktopPet:
 
         # 继续移动
         if self.state in ["moving", "border_moving"]:
-            self.root.after(50, self.move_pet)
+            self.scheduler.after(self.motion_interval_ms(), self.move_pet, TickScheduler.PRIORITY_MOTION,
+                                 name='move_pet')
         elif self.state == "manual":
-            self.root.after(1000, self.move_pet)
+            self.scheduler.after(1000, self.move_pet, TickScheduler.PRIORITY_MOTION, name='move_pet')
 
-    def move_along_border(self):
-        """沿边框移动"""
-        speed = 3  # 边框移动速度
+    def move_along_border(self, dt):
+        """沿边框移动，dt 是距上次移动经过的秒数"""
+        speed = 60 * dt  # 边框移动速度（像素/秒）
 
         if self.border_type == "left":
             # 沿左边框上下移动
@@ -1526,7 +3879,7 @@ class DesktopPet:
             self.y = self.screen_height - self.pet_height  # 保持贴下边
 
         # 更新位置
-        self.root.geometry(f"+{int(self.x)}+{int(self.y)}")
+        self.place_pet()
 
         # 检查是否还在边框位置，如果不在则切换回正常移动
         if not self.check_border_position():
@@ -1536,8 +3889,8 @@ class DesktopPet:
             else:
                 self.show_speech("自由啦！想去哪就去哪！😊")
             # 重新设置随机移动方向
-            self.dx = random.choice([-2, -1, 1, 2])
-            self.dy = random.choice([-2, -1, 1, 2])
+            self.dx = random_speed()
+            self.dy = random_speed()
 
     def start_random_movement(self):
         """开始随机移动序列"""
@@ -1545,7 +3898,7 @@ class DesktopPet:
             # 随机位置显示
             self.x = random.randint(0, self.screen_width - self.pet_width)
             self.y = random.randint(0, self.screen_height - self.pet_height)
-            self.root.geometry(f"+{int(self.x)}+{int(self.y)}")
+            self.place_pet()
             self.random_display_count += 1
 
             if self.random_display_count % 10 == 0:
@@ -1555,7 +3908,7 @@ class DesktopPet:
                     self.show_speech(f"到处乱跑第 {self.random_display_count} 次！😜")
 
             # 8秒后下次移动
-            self.root.after(8000, self.start_random_movement)
+            self.scheduler.after(8000, self.start_random_movement, name='random_movement')
         elif self.state == "random_display":
             # 30次随机显示完成，回到移动状态
             self.state = "moving"
@@ -1565,119 +3918,83 @@ class DesktopPet:
             else:
                 self.show_speech("继续到处捣蛋！😈")
             # 重新开始正常移动
-            self.move_pet()
+            self.restart_movement()
 
     def update_system_info(self):
-        """更新系统信息（后台运行，不显示对话）"""
-        # 这个方法现在只用于后台更新，对话由 schedule_speech 处理
-        self.root.after(300000, self.update_system_info)  # 5分钟更新一次
+        """启动后台的系统信息采集（不显示对话，对话由 schedule_speech 处理）"""
+        self.metrics_database.start()
+        self.metrics.start()
 
     def show_speech(self, message, duration=4000, special=False):
         """显示美化的圆角对话气泡"""
-        speech_window = tk.Toplevel(self.root)
-        speech_window.overrideredirect(True)
-        speech_window.wm_attributes('-topmost', True)
+        bubble = self.bubble_pool.acquire()
+        speech_window = bubble.window
 
-        # 创建主框架 - 使用Frame嵌套实现圆角效果，缩小外边距
-        main_frame = tk.Frame(speech_window, bg='#000000')  # 黑色外框模拟阴影
-        main_frame.pack(padx=2, pady=2)
-
-        # 内容框架 - 圆角效果
-        if special:
-            # 整点报时使用金色主题
-            bg_color = '#FFF8DC'  # 米色背景
-            text_color = '#B8860B'  # 深金色文字
-            border_color = '#FFD700'  # 金色边框
-        elif self.mode == "naughty":
-            # 捣蛋模式使用红色主题
-            bg_color = '#FFE4E1'  # 浅红色背景
-            text_color = '#DC143C'  # 深红色文字
-            border_color = '#FF6347'  # 番茄红边框
-        else:
-            # 乖巧模式使用粉色主题
-            bg_color = '#FFE4E6'  # 粉色背景
-            text_color = '#D63384'  # 深粉色文字
-            border_color = '#FFB6C1'  # 浅粉色边框
-
-        # 使用多层Frame模拟圆角 - 缩小边距
-        outer_frame = tk.Frame(main_frame, bg=border_color, bd=0)
-        outer_frame.pack(padx=1, pady=1)
-
-        inner_frame = tk.Frame(outer_frame, bg=bg_color, bd=0)
-        inner_frame.pack(padx=2, pady=2)
+        try:
+            # 内容框架 - 圆角效果
+            if special:
+                # 整点报时使用金色主题
+                bg_color = '#FFF8DC'  # 米色背景
+                text_color = '#B8860B'  # 深金色文字
+                border_color = '#FFD700'  # 金色边框
+            elif self.mode == "naughty":
+                # 捣蛋模式使用红色主题
+                bg_color = '#FFE4E1'  # 浅红色背景
+                text_color = '#DC143C'  # 深红色文字
+                border_color = '#FF6347'  # 番茄红边框
+            else:
+                # 乖巧模式使用粉色主题
+                bg_color = '#FFE4E6'  # 粉色背景
+                text_color = '#D63384'  # 深粉色文字
+                border_color = '#FFB6C1'  # 浅粉色边框
+
+            bubble.theme(message, bg_color, text_color, border_color, special)
+
+            # 位置在宠物旁边（位置是小数，Tk 的窗口坐标必须是整数）
+            pet_x, pet_y = int(self.x), int(self.y)
+            speech_x = pet_x + self.pet_width + 15
+            speech_y = pet_y - 10
+
+            # 确保对话框在屏幕内
+            speech_window.update_idletasks()  # 确保窗口尺寸计算完成
+            speech_width = speech_window.winfo_reqwidth()
+            speech_height = speech_window.winfo_reqheight()
+
+            if speech_x + speech_width > self.screen_width:
+                speech_x = pet_x - speech_width - 15
+            if speech_y + speech_height > self.screen_height:
+                speech_y = self.screen_height - speech_height - 10
+            if speech_x < 0:
+                speech_x = 10
+            if speech_y < 0:
+                speech_y = 10
 
-        # 文本标签 - 缩小尺寸
-        font_weight = 'bold' if special else 'normal'
-        font_size = 10 if special else 9
+            speech_window.geometry(f"+{speech_x}+{speech_y}")
 
-        label = tk.Label(inner_frame,
-                         text=message,
-                         bg=bg_color,
-                         fg=text_color,
-                         font=('Microsoft YaHei UI', font_size, font_weight),
-                         padx=8,
-                         pady=6,
-                         wraplength=150,
-                         justify='center')
-        label.pack()
-
-        # 添加特殊效果边框 - 缩小装饰线
-        if special:
-            # 整点报时添加装饰性边框
-            deco_frame = tk.Frame(inner_frame, bg='#FFD700', height=1, bd=0)
-            deco_frame.pack(fill='x', pady=(3, 0))
-
-        # 位置在宠物旁边
-        speech_x = self.x + self.pet_width + 15
-        speech_y = self.y - 10
-
-        # 确保对话框在屏幕内
-        speech_window.update_idletasks()  # 确保窗口尺寸计算完成
-        speech_width = speech_window.winfo_reqwidth()
-        speech_height = speech_window.winfo_reqheight()
-
-        if speech_x + speech_width > self.screen_width:
-            speech_x = self.x - speech_width - 15
-        if speech_y + speech_height > self.screen_height:
-            speech_y = self.screen_height - speech_height - 10
-        if speech_x < 0:
-            speech_x = 10
-        if speech_y < 0:
-            speech_y = 10
-
-        speech_window.geometry(f"+{speech_x}+{speech_y}")
-
-        # 添加淡入动画效果
-        speech_window.attributes('-alpha', 0.0)
-        self.fade_in_speech(speech_window, 0.0)
-
-        # 指定时间后淡出消失
-        speech_window.after(duration, lambda: self.fade_out_speech(speech_window, 1.0))
-
-    def fade_in_speech(self, window, alpha):
-        """对话框淡入动画"""
-        if alpha < 1.0:
-            alpha += 0.1
-            try:
-                window.attributes('-alpha', alpha)
-                window.after(30, lambda: self.fade_in_speech(window, alpha))
-            except tk.TclError:
-                pass  # 窗口已销毁
+            # 添加淡入动画效果
+            speech_window.attributes('-alpha', 0.0)
+            speech_window.deiconify()
+            self.fade_in_speech(speech_window)
 
-    def fade_out_speech(self, window, alpha):
-        """对话框淡出动画"""
-        if alpha > 0.0:
-            alpha -= 0.1
-            try:
-                window.attributes('-alpha', alpha)
-                window.after(30, lambda: self.fade_out_speech(window, alpha))
-            except tk.TclError:
-                pass  # 窗口已销毁
-        else:
-            try:
-                window.destroy()
-            except tk.TclError:
-                pass  # 窗口已销毁
+            # 指定时间后淡出，然后放回窗口池
+            self.scheduler.after(duration, lambda: self.fade_out_speech(bubble))
+        except Exception as e:
+            # 出错时也要放回窗口池，否则这个窗口永远不会被重复使用
+            print(f"显示对话失败: {e}")
+            self.bubble_pool.release(bubble, self.tweens)
+
+    def fade_in_speech(self, window, duration_ms=300):
+        """对话框淡入动画，降低画质时直接显示"""
+        if self.frame_monitor.skip_fades:
+            duration_ms = 0
+        self.tweens.fade(window, 0.0, 1.0, duration_ms)
+
+    def fade_out_speech(self, bubble, duration_ms=300):
+        """对话框淡出动画，结束后放回窗口池"""
+        if self.frame_monitor.skip_fades:
+            duration_ms = 0
+        self.tweens.fade(bubble.window, 1.0, 0.0, duration_ms,
+                         on_done=lambda: self.bubble_pool.release(bubble, self.tweens))
 
     def clean_cache(self):
         """清理缓存"""
@@ -1714,23 +4031,74 @@ class DesktopPet:
     def show_system_info(self):
         """显示系统信息"""
         try:
-            cpu_percent = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
-            memory_percent = memory.percent
-            memory_used = memory.used / (1024 ** 3)  # GB
-            memory_total = memory.total / (1024 ** 3)  # GB
-
-            disk = psutil.disk_usage('/')
-            disk_percent = disk.percent
+            # 读取后台采集的快照，不在主线程中调用 psutil
+            metrics = self.metrics.snapshot
+            if not self.metrics.ready:
+                self.show_speech("系统信息还在采集中，稍等一下哦～")
+                return
 
-            # 获取进程数
-            process_count = len(psutil.pids())
+            cpu_percent = metrics.cpu_percent
+            memory_percent = metrics.memory_percent
+            memory_used = metrics.memory_used / (1024 ** 3)  # GB
+            memory_total = metrics.memory_total / (1024 ** 3)  # GB
+            disk_percent = metrics.disk_percent
+            process_count = metrics.process_count
+            busiest_core = max(metrics.cpu_per_core, default=0.0)
+
+            # 最近10分钟的走势
+            history = self.metrics_history
+            cpu_trend = history.sparkline('cpu', 600)
+            memory_trend = history.sparkline('memory', 600)
+            hour_cpu = history.average('cpu', 3600)
+
+            # 占用最多的进程（由采集线程统计）
+            top = self.process_tracker.top
+            top_lines = ""
+            if top.cpu:
+                top_lines = (
+                    "\n最耗CPU: " + "，".join(f"{p.name} {p.cpu:.1f}%" for p in top.cpu[:3]) +
+                    "\n最占内存: " + "，".join(f"{p.name} {p.rss / (1024 ** 2):.0f}MB" for p in top.memory[:3]))
+                if top.io and top.io[0].io_rate > 0:
+                    top_lines += "\n最多读写: " + "，".join(f"{p.name} {p.io_rate / (1024 ** 2):.1f}MB/s"
+                                                           for p in top.io[:3] if p.io_rate > 0)
+
+            # 数据库中最近一周的统计（写入线程每次写入后计算）
+            week = self.metrics_database.summary
+            if week is not None:
+                week_line = (f"\n最近一周: CPU平均 {week['cpu_avg']:.1f}% 最高 {week['cpu_max']:.1f}%，"
+                             f"内存平均 {week['memory_avg']:.1f}% 最高 {week['memory_max']:.1f}%")
+            else:
+                week_line = ""
+
+            # 动画帧内存占用
+            frame_used = self.frame_budget.total_bytes() / (1024 ** 2)  # MB
+            canvas_used = self.frame_budget.canvas_bytes / (1024 ** 2)  # 其中显示者画布占用
+            frame_hit_rate = self.frame_budget.hit_rate() * 100
+
+            # 电源策略
+            governor = self.power_governor
+            power_line = f"电源策略: {governor.policy.label}（{governor.reason}）"
+            if governor.history:
+                changed_at, old_label, new_label, _ = governor.history[-1]
+                power_line += f"\n上次切换: {changed_at} {old_label} -> {new_label}"
+
+            # 主循环帧时间
+            late_p50, late_p95, work_p95 = self.frame_monitor.stats()
+            frame_line = (f"帧时间: 延迟p50 {late_p50:.0f}ms / p95 {late_p95:.0f}ms，"
+                          f"耗时p95 {work_p95:.0f}ms，画质{self.frame_monitor.label}，"
+                          f"动画累计跳过 {self.pet_cursor.dropped} 帧")
 
             # 构建消息字符串
-            message = (f"CPU使用率: {cpu_percent}%\n"
+            message = (f"CPU使用率: {cpu_percent}%（最忙的核心 {busiest_core}%）\n"
                        f"内存: {memory_used:.2f} GB / {memory_total:.2f} GB ({memory_percent}%)\n"
                        f"磁盘使用率: {disk_percent}%\n"
-                       f"进程数: {process_count}")
+                       f"进程数: {process_count}（统计耗时 {self.process_tracker.last_cost_ms:.0f}ms）{top_lines}\n"
+                       f"CPU走势(10分钟): {cpu_trend}（1小时平均 {hour_cpu or 0:.1f}%）\n"
+                       f"内存走势(10分钟): {memory_trend}{week_line}\n"
+                       f"动画帧: {frame_used:.1f} MB / {self.frame_memory_mb} MB "
+                       f"(画布{canvas_used:.1f} MB，命中率{frame_hit_rate:.0f}%)\n"
+                       f"{power_line}\n"
+                       f"{frame_line}")
 
             # 根据模式添加不同的前缀
             if self.mode == "good":
@@ -1749,5 +4117,18 @@ class DesktopPet:
 
     # 启动应用
 if __name__ == "__main__":
-        pet = DesktopPet()
+    # python zsj.py build-bundle [图片文件夹] [资源包路径]
+    # python zsj.py --compositor  所有宠物画在一个全屏窗口上，适合分身很多的情况
+    # python zsj.py --motion-hz 30  移动刷新频率（10-60），越高越平滑也越耗CPU
+    if len(sys.argv) > 1 and sys.argv[1] == "build-bundle":
+        build_asset_bundle(*sys.argv[2:4])
+    else:
+        options = sys.argv[1:]
+        motion_hz = 20
+        if "--motion-hz" in options:
+            try:
+                motion_hz = int(options[options.index("--motion-hz") + 1])
+            except (IndexError, ValueError):
+                print("--motion-hz 需要一个10到60之间的整数，使用默认值20")
+        pet = DesktopPet(compositor="--compositor" in options, motion_hz=motion_hz)
         pet.root.mainloop()